@@ -0,0 +1,420 @@
+"""
+Write side of the analytics store: session and heavy-hitter sketches, the
+hour/day rollup buckets and the insert path that keeps them in step with
+analytics_events. Kept free of the FastAPI app so scripts can persist
+events without importing server.py.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== HYPERLOGLOG SKETCHES ====================
+
+HLL_PRECISION = 12  # 4096 registers
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter over 64-bit blake2b hashes. With p=12 the
+    relative standard error is 1.04 / sqrt(4096) ~= 1.6%. Registers merge by
+    taking the maximum, which MongoDB can do atomically with $max, so each
+    rollup bucket stores its registers sparsely as {"<index>": rank}.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    @staticmethod
+    def position(value: str, precision: int = HLL_PRECISION) -> tuple:
+        """(register index, rank) for a value; stable across processes"""
+        x = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = x >> (64 - precision)
+        remainder = x & ((1 << (64 - precision)) - 1)
+        rank = (64 - precision) - remainder.bit_length() + 1
+        return index, rank
+
+    def add(self, value: str) -> None:
+        index, rank = self.position(value, self.precision)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge_sparse(self, registers: Dict[str, int]) -> None:
+        for index, rank in registers.items():
+            index = int(index)
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self) -> float:
+        return round(1.04 / math.sqrt(self.size), 4)
+
+
+# ==================== HEAVY-HITTER SKETCHES ====================
+
+ROLLUP_TOPK_CAPACITY = int(os.environ.get('ROLLUP_TOPK_CAPACITY', '50'))
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-K summary: at most `capacity` values, each with an
+    overestimated count and the maximum overestimate (error). Summaries
+    merge by adding counts, charging a value missing from a full summary
+    that summary's smallest count, and keeping the `capacity` largest, so
+    the merge of any number of buckets stays the same size.
+    """
+
+    def __init__(self, capacity: int = ROLLUP_TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counters: Dict[str, List[int]] = {}  # value -> [count, error]
+
+    @classmethod
+    def from_document(cls, document: Optional[Dict[str, List[int]]], capacity: int = ROLLUP_TOPK_CAPACITY) -> "SpaceSaving":
+        summary = cls(capacity)
+        summary.counters = {decode_rollup_key(key): list(counter) for key, counter in (document or {}).items()}
+        return summary
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, int], capacity: int = ROLLUP_TOPK_CAPACITY) -> "SpaceSaving":
+        """Exact counts (e.g. one flush batch), truncated to the capacity"""
+        summary = cls(capacity)
+        summary.merge_counters({value: [count, 0] for value, count in counts.items()}, 0)
+        return summary
+
+    def to_document(self) -> Dict[str, List[int]]:
+        return {encode_rollup_key(value): counter for value, counter in self.counters.items()}
+
+    def floor(self) -> int:
+        """Upper bound for the count of any value not in the summary"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def merge(self, other: "SpaceSaving") -> None:
+        self.merge_counters(other.counters, other.floor())
+
+    def merge_counters(self, counters: Dict[str, List[int]], other_floor: int) -> None:
+        floor = self.floor()
+        merged = {}
+        for value in self.counters.keys() | counters.keys():
+            count, error = self.counters.get(value, (floor, floor))
+            other_count, other_error = counters.get(value, (other_floor, other_floor))
+            merged[value] = [count + other_count, error + other_error]
+        ranked = sorted(merged.items(), key=lambda item: (-item[1][0], item[0]))
+        self.counters = dict(ranked[:self.capacity])
+
+    def estimates(self) -> Dict[str, int]:
+        return {value: count for value, (count, _) in self.counters.items()}
+
+
+# ==================== ROLLUP BUCKETS ====================
+
+# Pre-aggregated hour and day buckets, kept up to date on every tracked event
+# so the stats endpoint reads a handful of small documents instead of raw events.
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+# Dimension -> value used when the event does not carry one
+ROLLUP_DIMENSIONS = {
+    "event_type": "Unknown",
+    "device_type": "desktop",
+    "browser": "Unknown",
+    "os": "Unknown",
+    "traffic_source": "direct",
+    "source_detail": "Direct",
+    "country": "Unknown",
+    "city": "Unknown",
+    "page_url": "Unknown",
+}
+
+# Dimensions whose cardinality is unbounded (referrer spam, crawled URLs) are
+# kept as SpaceSaving summaries under topk.<dimension> instead of exact
+# counter maps; value -> event_type counted (None: every event)
+ROLLUP_TOPK_DIMENSIONS = {
+    "country": None,
+    "city": None,
+    "source_detail": None,
+    "page_url": "pageview",
+}
+ROLLUP_TOPK_RETRIES = 5
+# Top-K counts whose merge kept conflicting, per collection name and bucket
+# id; folded into the next flush to the same collection instead of dropped
+deferred_topk: Dict[str, Dict[str, Dict[str, Dict[str, int]]]] = defaultdict(dict)
+
+# Counters are sums of sample weights, except sampled_events (stored events)
+ROLLUP_COUNTERS = ("events", "sampled_events", "new_visitors", "returning_visitors", "duration_sum", "duration_count")
+
+
+def as_utc(value: Any) -> datetime:
+    """Normalize an ISO string or naive/aware datetime to an aware UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def rollup_bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a UTC timestamp to the start of its hour or day bucket"""
+    timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def rollup_bucket_id(bucket_start: datetime, granularity: str) -> str:
+    fmt = "%Y-%m-%dT%H" if granularity == "hour" else "%Y-%m-%d"
+    return f"{granularity}:{bucket_start.strftime(fmt)}"
+
+
+def encode_rollup_key(value: Any) -> str:
+    """Make a dimension value safe to use as a MongoDB field name (domains contain dots)"""
+    key = str(value) if value not in (None, "") else "Unknown"
+    return key.replace(".", "\uff0e").replace("$", "\uff04")
+
+
+def decode_rollup_key(key: str) -> str:
+    return key.replace("\uff0e", ".").replace("\uff04", "$")
+
+
+class AnalyticsRollupBatch:
+    """
+    Accumulates $inc counters for every hour and day bucket touched by a set
+    of events and flushes them to `collection` (analytics_rollups, or a
+    rebuild's staging collection)
+    """
+
+    def __init__(self, collection, granularities: tuple = ROLLUP_GRANULARITIES):
+        self.collection = collection
+        self.granularities = granularities
+        self.buckets: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, event: Dict[str, Any]) -> None:
+        timestamp = as_utc(event.get("timestamp"))
+        for granularity in self.granularities:
+            bucket_start = rollup_bucket_start(timestamp, granularity)
+            bucket = self.buckets.setdefault(
+                rollup_bucket_id(bucket_start, granularity),
+                {
+                    "granularity": granularity,
+                    "bucket": bucket_start,
+                    "inc": defaultdict(int),
+                    "max": {},
+                    "topk": defaultdict(lambda: defaultdict(int)),
+                }
+            )
+            self.count(bucket["inc"], event)
+            self.sketch(bucket["max"], event)
+            self.rank(bucket["topk"], event)
+
+    @staticmethod
+    def count(inc: Dict[str, int], event: Dict[str, Any]) -> None:
+        weight = event.get("sample_weight") or 1
+        inc["events"] += weight
+        inc["sampled_events"] += 1
+        for dimension, default in ROLLUP_DIMENSIONS.items():
+            if dimension not in ROLLUP_TOPK_DIMENSIONS:
+                inc[f"{dimension}.{encode_rollup_key(event.get(dimension) or default)}"] += weight
+
+        if event.get("event_type") == "pageview":
+            if event.get("is_new_visitor"):
+                inc["new_visitors"] += weight
+            if event.get("is_returning"):
+                inc["returning_visitors"] += weight
+
+        if event.get("session_duration"):
+            inc["duration_sum"] += event["session_duration"] * weight
+            inc["duration_count"] += weight
+
+    @staticmethod
+    def sketch(registers: Dict[str, int], event: Dict[str, Any]) -> None:
+        """Fold the session into the bucket's HyperLogLog registers (hll.<index>)"""
+        session_id = event.get("session_id")
+        if not session_id:
+            return
+        index, rank = HyperLogLog.position(session_id)
+        field = f"hll.{index}"
+        if rank > registers.get(field, 0):
+            registers[field] = rank
+
+    @staticmethod
+    def rank(topk: Dict[str, Dict[str, int]], event: Dict[str, Any]) -> None:
+        """Exact per-batch counts for the top-K dimensions; merged into the stored summaries on flush"""
+        for dimension, event_type in ROLLUP_TOPK_DIMENSIONS.items():
+            if event_type is None or event.get("event_type") == event_type:
+                topk[dimension][event.get(dimension) or ROLLUP_DIMENSIONS[dimension]] += event.get("sample_weight") or 1
+
+    def operations(self) -> List[UpdateOne]:
+        now = datetime.now(timezone.utc)
+        return [
+            UpdateOne(
+                {"_id": bucket_id},
+                {
+                    "$inc": dict(bucket["inc"]),
+                    **({"$max": bucket["max"]} if bucket["max"] else {}),
+                    "$setOnInsert": {"granularity": bucket["granularity"], "bucket": bucket["bucket"]},
+                    "$set": {"updated_at": now},
+                },
+                upsert=True
+            )
+            for bucket_id, bucket in self.buckets.items()
+        ]
+
+    async def flush(self) -> None:
+        operations = self.operations()
+        buckets, self.buckets = self.buckets, {}
+        deferred = deferred_topk.pop(self.collection.name, {})
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+        topk = {bucket_id: bucket["topk"] for bucket_id, bucket in buckets.items() if bucket["topk"]}
+        for bucket_id, counts in deferred.items():
+            merged = topk.setdefault(bucket_id, defaultdict(lambda: defaultdict(int)))
+            for dimension, dimension_counts in counts.items():
+                for label, count in dimension_counts.items():
+                    merged[dimension][label] += count
+        bucket_ids = list(topk)
+        results = await asyncio.gather(*(merge_rollup_topk(self.collection, bucket_id, topk[bucket_id]) for bucket_id in bucket_ids))
+        for bucket_id, merged in zip(bucket_ids, results):
+            if not merged:
+                deferred_topk[self.collection.name][bucket_id] = topk[bucket_id]
+
+
+async def merge_rollup_topk(collection, bucket_id: str, counts: Dict[str, Dict[str, int]]) -> bool:
+    """
+    Merge a batch's exact counts into the bucket's stored top-K summaries.
+    A summary can't be updated with $inc, so this is a read-merge-write
+    guarded by topk_version and retried when another writer got there first.
+    Returns False when every retry conflicted; the caller defers the counts.
+    A bucket deleted in the meantime (purge, retention) takes nothing.
+    """
+    for _ in range(ROLLUP_TOPK_RETRIES):
+        bucket = await collection.find_one({"_id": bucket_id}, {"topk": 1, "topk_version": 1})
+        if bucket is None:
+            return True
+        stored = bucket.get("topk") or {}
+        update = {}
+        for dimension, dimension_counts in counts.items():
+            summary = SpaceSaving.from_document(stored.get(dimension))
+            summary.merge(SpaceSaving.from_counts(dimension_counts))
+            update[f"topk.{dimension}"] = summary.to_document()
+
+        # A missing topk_version matches None, i.e. buckets never merged before
+        result = await collection.update_one(
+            {"_id": bucket_id, "topk_version": bucket.get("topk_version")},
+            {"$set": update, "$inc": {"topk_version": 1}}
+        )
+        if result.matched_count:
+            return True
+    logger.warning(f"Deferring top-K merge into rollup bucket {bucket_id} to the next flush after {ROLLUP_TOPK_RETRIES} conflicts")
+    return False
+
+
+# ==================== SESSIONS ====================
+
+def session_operations(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """Upserts keeping first_seen, last_seen and counters per session in analytics_sessions"""
+    sessions: Dict[str, Dict[str, Any]] = {}
+    for doc in docs:
+        session_id = doc.get("session_id")
+        if not session_id:
+            continue
+        timestamp = as_utc(doc.get("timestamp"))
+        session = sessions.setdefault(session_id, {"first_seen": timestamp, "last_seen": timestamp, "pageviews": 0, "events": 0})
+        session["first_seen"] = min(session["first_seen"], timestamp)
+        session["last_seen"] = max(session["last_seen"], timestamp)
+        session["events"] += 1
+        if doc.get("event_type") == "pageview":
+            session["pageviews"] += 1
+
+    return [
+        UpdateOne(
+            {"session_id": session_id},
+            {
+                "$min": {"first_seen": session["first_seen"]},
+                "$max": {"last_seen": session["last_seen"]},
+                "$inc": {"pageviews": session["pageviews"], "events": session["events"]},
+            },
+            upsert=True
+        )
+        for session_id, session in sessions.items()
+    ]
+
+
+# ==================== PERSISTENCE ====================
+
+async def persist_analytics_events(db, docs: List[Dict[str, Any]]) -> Dict[int, str]:
+    """
+    Write enriched events with one unordered insert_many and update the
+    rollups for the ones that made it. Returns {position: error} for failures.
+
+    Never raises a database error: once the insert went through, the events
+    are stored and must not be reported as failed (a client retrying the
+    batch would store them twice), so a failing rollup or session update is
+    only logged. A failed insert marks every event of the batch as failed.
+    """
+    if not docs:
+        return {}
+    
+    failed_positions = {}
+    try:
+        await db.analytics_events.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failed_positions = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+    except PyMongoError as e:
+        logger.error(f"Inserting {len(docs)} analytics events failed: {e}")
+        return {position: f"write failed: {e}" for position in range(len(docs))}
+    
+    stored = [doc for position, doc in enumerate(docs) if position not in failed_positions]
+    rollups = AnalyticsRollupBatch(db.analytics_rollups)
+    for doc in stored:
+        rollups.add(doc)
+    try:
+        await rollups.flush()
+    except PyMongoError as e:
+        logger.error(f"Rollups of {len(stored)} stored analytics events not updated (POST /api/analytics/rollups/rebuild recomputes them): {e}")
+    
+    try:
+        await upsert_sessions(db, stored)
+    except PyMongoError as e:
+        logger.error(f"Sessions of {len(stored)} stored analytics events not updated: {e}")
+    
+    return failed_positions
+
+
+async def upsert_sessions(db, stored: List[Dict[str, Any]]) -> None:
+    operations = session_operations(stored)
+    if not operations:
+        return
+    try:
+        await db.analytics_sessions.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Concurrent upserts of a brand new session race on the unique
+        # index; the loser simply retries as an update
+        retry = [operations[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+        if len(retry) < len(e.details.get("writeErrors", [])):
+            raise
+        await db.analytics_sessions.bulk_write(retry, ordered=False)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Build the binary GeoIP table read by server.py (GEOIP_TABLE_PATH) from an
+IPv4 range CSV such as DB-IP "IP to City Lite":
+
+    python build_geoip_table.py dbip-city-lite.csv geoip.bin --country-column 3 --city-column 5
+
+Rows are start_ip,end_ip,... with addresses in dotted or integer form;
+IPv6 rows are skipped. The default columns fit a plain
+start_ip,end_ip,country,city file.
+
+Table layout (little-endian), matching GeoIPTable in server.py:
+    header      magic "GEO1", uint32 range count N, uint32 location count L
+    starts      N x uint32, sorted ascending
+    ends        N x uint32
+    locations   N x uint32 index into the location strings
+    offsets     (L + 1) x uint32 into the string blob
+    blob        UTF-8 "country<TAB>city" strings
+"""
+import argparse
+import csv
+import ipaddress
+import struct
+from pathlib import Path
+
+GEOIP_MAGIC = b"GEO1"
+
+
+def parse_ipv4(value: str):
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return number if number < 2 ** 32 else None
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    return int(address) if address.version == 4 else None
+
+
+def read_ranges(csv_path: Path, country_column: int, city_column: int):
+    """(start, end, country, city) rows of the IPv4 ranges in the CSV"""
+    ranges = []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) <= max(country_column, city_column):
+                continue
+            start, end = parse_ipv4(row[0]), parse_ipv4(row[1])
+            if start is None or end is None or end < start:
+                continue  # header, IPv6 or malformed row
+            country = row[country_column].strip() or "Unknown"
+            city = row[city_column].strip() or "Unknown"
+            ranges.append((start, end, country, city))
+    return ranges
+
+
+def normalize_ranges(ranges):
+    """Sort, drop overlaps (first range wins) and join adjacent ranges of the same location"""
+    normalized = []
+    for start, end, country, city in sorted(ranges):
+        if normalized:
+            last_start, last_end, last_country, last_city = normalized[-1]
+            if start <= last_end:
+                if end <= last_end:
+                    continue
+                start = last_end + 1
+            if start == last_end + 1 and (country, city) == (last_country, last_city):
+                normalized[-1] = (last_start, end, country, city)
+                continue
+        normalized.append((start, end, country, city))
+    return normalized
+
+
+def write_table(ranges, output_path: Path) -> int:
+    locations = {}
+    for _, _, country, city in ranges:
+        locations.setdefault(f"{country}\t{city}", len(locations))
+
+    blob = bytearray()
+    offsets = [0]
+    for location in locations:
+        blob += location.encode("utf-8")
+        offsets.append(len(blob))
+
+    count = len(ranges)
+    with open(output_path, "wb") as f:
+        f.write(struct.pack("<4sII", GEOIP_MAGIC, count, len(locations)))
+        f.write(struct.pack(f"<{count}I", *(start for start, _, _, _ in ranges)))
+        f.write(struct.pack(f"<{count}I", *(end for _, end, _, _ in ranges)))
+        f.write(struct.pack(f"<{count}I", *(locations[f"{country}\t{city}"] for _, _, country, city in ranges)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(blob)
+    return len(locations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the GeoIP table used for analytics geolocation")
+    parser.add_argument("csv_path", type=Path)
+    parser.add_argument("output_path", type=Path)
+    parser.add_argument("--country-column", type=int, default=2)
+    parser.add_argument("--city-column", type=int, default=3)
+    args = parser.parse_args()
+
+    ranges = normalize_ranges(read_ranges(args.csv_path, args.country_column, args.city_column))
+    location_count = write_table(ranges, args.output_path)
+    print(f"✅ Wrote {len(ranges)} IPv4 ranges and {location_count} locations to {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Write counters of the CMS collections, kept in one content_versions
+document. server.py derives content ETags and its response and settings
+caches from them, so anything that changes a CMS collection outside the
+API (migrations, seeding, manual edits) must bump its collections too,
+or clients keep revalidating the old content with 304s.
+
+After a manual edit, bump from the command line:
+    python content_versions.py drawer_cards faq_items
+"""
+import asyncio
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable
+from uuid import uuid4
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CONTENT_VERSIONS_ID = "cms"
+CONTENT_VERSION_BUMP_RETRIES = 3
+
+
+async def bump_content_versions(db, collections: Iterable[str]) -> Dict[str, Any]:
+    """
+    Atomically increment the counters of `collections` and return the
+    updated document. The epoch is set when the document is created, so
+    ETags issued before it was dropped never match again. Transient errors
+    are retried; the last one is raised.
+    """
+    update = {"$inc": {collection: 1 for collection in collections}, "$setOnInsert": {"epoch": uuid4().hex}}
+    for attempt in range(CONTENT_VERSION_BUMP_RETRIES):
+        try:
+            return await db.content_versions.find_one_and_update(
+                {"_id": CONTENT_VERSIONS_ID},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError as e:
+            if attempt + 1 == CONTENT_VERSION_BUMP_RETRIES:
+                raise
+            logger.warning(f"Content version bump failed, retrying: {e}")
+            await asyncio.sleep(0.1 * 2 ** attempt)
+
+
+async def main(collections):
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        doc = await bump_content_versions(client[os.environ['DB_NAME']], collections)
+        print(", ".join(f"{collection}: {doc[collection]}" for collection in collections))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python content_versions.py <collection> [<collection> ...]")
+    asyncio.run(main(sys.argv[1:]))
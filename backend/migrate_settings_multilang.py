@@ -8,6 +8,8 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from content_versions import bump_content_versions
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -168,6 +170,7 @@ async def main():
     
     await migrate_platform_settings()
     await migrate_community_settings()
+    await bump_content_versions(db, ("platform_settings", "community_settings"))
     
     print("=" * 60)
     print("✅ Settings migration completed!")
@@ -8,6 +8,8 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from content_versions import bump_content_versions
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -185,6 +187,9 @@ async def main():
     await migrate_roadmap()
     await migrate_evolution_levels()
     await migrate_evolution_badges()
+    await bump_content_versions(db, (
+        "drawer_cards", "team_members", "partners", "faq_items", "roadmap_settings", "evolution_levels", "evolution_badges",
+    ))
     
     print("=" * 60)
     print("✅ Migration completed!")
@@ -10,6 +10,8 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from analytics_store import persist_analytics_events
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -109,7 +111,7 @@ async def generate_session(session_id, country, city, is_new=True, days_ago=0):
             "referrer": referrer,
             "traffic_source": traffic_source,
             "source_detail": source_detail,
-            "timestamp": timestamp.isoformat(),
+            "timestamp": timestamp,
             "session_duration": session_duration if i == num_pageviews - 1 else None,
             "is_new_visitor": is_new and i == 0,
             "is_returning": not is_new and i == 0
@@ -140,7 +142,7 @@ async def generate_session(session_id, country, city, is_new=True, days_ago=0):
                 "referrer": referrer,
                 "traffic_source": traffic_source,
                 "source_detail": source_detail,
-                "timestamp": timestamp.isoformat(),
+                "timestamp": timestamp,
                 "is_new_visitor": False,
                 "is_returning": not is_new
             }
@@ -166,7 +168,7 @@ async def generate_session(session_id, country, city, is_new=True, days_ago=0):
             "referrer": referrer,
             "traffic_source": traffic_source,
             "source_detail": source_detail,
-            "timestamp": timestamp.isoformat(),
+            "timestamp": timestamp,
             "is_new_visitor": False,
             "is_returning": not is_new
         }
@@ -181,6 +183,8 @@ async def seed_data():
     
     # Clear existing data
     await db.analytics_events.delete_many({})
+    await db.analytics_rollups.delete_many({})
+    await db.analytics_sessions.delete_many({})
     print("✅ Cleared existing analytics data")
     
     all_events = []
@@ -211,7 +215,9 @@ async def seed_data():
     
     # Insert all events
     if all_events:
-        await db.analytics_events.insert_many(all_events)
+        # Goes through the same path as the write-behind buffer so the
+        # rollups and the session index are filled too
+        await persist_analytics_events(db, all_events)
         print(f"✅ Inserted {len(all_events)} analytics events")
         print(f"📊 Generated {session_counter} unique sessions")
         print(f"📍 Data spans last 30 days")
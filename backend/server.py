@@ -1,21 +1,64 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Request
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from fastapi.dependencies.utils import get_flat_dependant
+from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, ValidationError
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from uuid import uuid4
 from datetime import datetime, timezone, timedelta
 import shutil
 import base64
-from collections import defaultdict
+import csv
+import gzip
+import io
+import json
+import hashlib
+import ipaddress
+import math
+import mmap
+import struct
+import time
+from collections import Counter, defaultdict, OrderedDict
+from functools import lru_cache
+from urllib.parse import urlparse
 import user_agents
 import httpx
+import numpy as np
+import pandas as pd
+
+from analytics_store import (
+    HyperLogLog,
+    SpaceSaving,
+    ROLLUP_COUNTERS,
+    ROLLUP_DIMENSIONS,
+    ROLLUP_GRANULARITIES,
+    ROLLUP_TOPK_DIMENSIONS,
+    AnalyticsRollupBatch,
+    as_utc,
+    decode_rollup_key,
+    encode_rollup_key,
+    persist_analytics_events,
+    rollup_bucket_id,
+    rollup_bucket_start,
+)
+from content_versions import CONTENT_VERSIONS_ID, bump_content_versions
+
+try:
+    import brotli
+except ImportError:  # optional: cached responses are then kept as identity and gzip only
+    brotli = None
 
 
 ROOT_DIR = Path(__file__).parent
@@ -36,8 +79,344 @@ app = FastAPI()
 # Mount static files for uploads
 app.mount("/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
 
+# ==================== CONDITIONAL GET ====================
+
+CONTENT_MAX_AGE_SECONDS = int(os.environ.get('CONTENT_MAX_AGE_SECONDS', '0'))
+CONTENT_STALE_WHILE_REVALIDATE_SECONDS = int(os.environ.get('CONTENT_STALE_WHILE_REVALIDATE_SECONDS', '60'))
+CONTENT_VERSION_CHECK_SECONDS = float(os.environ.get('CONTENT_VERSION_CHECK_SECONDS', '1'))
+# First delay before retrying a version bump that failed after a write; doubles up to a minute
+CONTENT_VERSION_RETRY_SECONDS = 1.0
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '512'))
+# Safety net for content changed without a version bump
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '300'))
+RESPONSE_CACHE_MIN_COMPRESS_BYTES = 1024
+# Compression runs on the request that missed: mid levels keep that cheap
+RESPONSE_CACHE_GZIP_LEVEL = int(os.environ.get('RESPONSE_CACHE_GZIP_LEVEL', '6'))
+RESPONSE_CACHE_BROTLI_QUALITY = int(os.environ.get('RESPONSE_CACHE_BROTLI_QUALITY', '5'))
+
+# First path segment under /api -> CMS collections its responses are built from
+CONTENT_ROUTE_COLLECTIONS = {
+    "drawer-cards": ("drawer_cards",),
+    "team-members": ("team_members",),
+    "platform-settings": ("platform_settings",),
+    "roadmap": ("roadmap_settings", "roadmap_tasks"),
+    "partners": ("partners",),
+    "footer-settings": ("footer_settings",),
+    "faq": ("faq_items",),
+    "community-settings": ("community_settings",),
+    "hero-settings": ("hero_settings",),
+    "about-settings": ("about_settings",),
+    "hero-buttons": ("hero_buttons",),
+    "navigation-items": ("navigation_items",),
+    "evolution-levels": ("evolution_levels",),
+    "evolution-badges": ("evolution_badges",),
+    "p2p-deals": ("p2p_deals",),
+    "arena-predictions": ("arena_predictions",),
+    "influence-entities": ("influence_entities",),
+    "earlyland-opportunities": ("earlyland_opportunities",),
+}
+CONTENT_ROUTE_COLLECTIONS["bootstrap"] = tuple(
+    collection
+    for segment in (
+        "hero-settings", "hero-buttons", "navigation-items", "platform-settings", "drawer-cards", "team-members",
+        "roadmap", "partners", "faq", "community-settings", "about-settings", "footer-settings",
+    )
+    for collection in CONTENT_ROUTE_COLLECTIONS[segment]
+)
+
+
+class ContentVersions:
+    """
+    Per-collection write counters shared by all workers through one
+    `content_versions` document (content_versions.py). Every successful
+    write through the API bumps its collections with an atomic $inc; readers re-read the document
+    at most once every `check_interval` seconds, so a write handled by
+    another worker is seen within that interval. Content ETags and settings
+    cache entries are validated against these counters instead of reloading
+    the content. The epoch is set when the document is created, so ETags do
+    not match again if it is ever dropped.
+
+    A write whose bump failed is already committed, so it is not reported as
+    failed: its collections are marked dirty and the bump is retried in the
+    background. Until it succeeds they have no stamp or ETag, which keeps
+    this worker from answering 304 or serving cached copies of them.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.epoch: Optional[str] = None
+        self.versions: Counter = Counter()
+        self.checked_at = float("-inf")
+        self.check: Optional[asyncio.Task] = None
+        self.dirty: Counter = Counter()  # collection -> writes waiting for a bump
+
+    def apply(self, doc: Optional[dict]) -> None:
+        doc = doc or {}
+        if doc.get("epoch") != self.epoch:
+            self.epoch = doc.get("epoch")
+            self.versions = Counter()
+        # Counters only grow: a check that read the document before one of
+        # our own bumps must not roll it back
+        for collection, version in doc.items():
+            if collection not in ("_id", "epoch") and version > self.versions[collection]:
+                self.versions[collection] = version
+        self.checked_at = time.monotonic()
+
+    async def load(self) -> None:
+        try:
+            self.apply(await db.content_versions.find_one({"_id": CONTENT_VERSIONS_ID}))
+        except Exception as e:
+            # Keep the last known versions; retry after the next interval
+            logger.warning(f"Content version check failed: {e}")
+            self.checked_at = time.monotonic()
+        finally:
+            self.check = None
+
+    async def refresh(self) -> None:
+        if time.monotonic() - self.checked_at < self.check_interval:
+            return
+        if self.check is None:
+            self.check = asyncio.create_task(self.load())
+        await asyncio.shield(self.check)
+
+    async def bump(self, collections: tuple) -> None:
+        self.apply(await bump_content_versions(db, collections))
+
+    def bump_later(self, collections: tuple) -> None:
+        """Mark `collections` dirty and retry their bump in the background"""
+        self.dirty.update(collections)
+        spawn_background_task(self.retry_bump(collections))
+
+    async def retry_bump(self, collections: tuple) -> None:
+        delay = CONTENT_VERSION_RETRY_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.bump(collections)
+            except Exception as e:
+                logger.warning(f"Retrying content version bump of {', '.join(collections)} failed: {e}")
+                delay = min(delay * 2, 60)
+                continue
+            self.dirty.subtract(collections)
+            self.dirty = +self.dirty
+            logger.info(f"Content versions of {', '.join(collections)} bumped after retrying")
+            return
+
+    def stamp(self, collections: tuple) -> Optional[str]:
+        """Version stamp of `collections`; None while one of them is dirty"""
+        if any(self.dirty[collection] for collection in collections):
+            return None
+        return f"{self.epoch}|" + ",".join(f"{collection}:{self.versions[collection]}" for collection in collections)
+
+    def etag(self, collections: tuple) -> Optional[str]:
+        stamp = self.stamp(collections)
+        if stamp is None:
+            return None
+        digest = hashlib.blake2b(stamp.encode(), digest_size=12).hexdigest()
+        return f'W/"{digest}"'
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "check_interval_seconds": self.check_interval,
+            "epoch": self.epoch,
+            "versions": dict(self.versions),
+            "pending_bumps": dict(self.dirty),
+            "checked_seconds_ago": round(time.monotonic() - self.checked_at, 1) if self.checked_at > float("-inf") else None,
+        }
+
+
+content_versions = ContentVersions(CONTENT_VERSION_CHECK_SECONDS)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def compress_encodings(body: bytes) -> Dict[str, bytes]:
+    """The body in every content coding worth sending for it"""
+    encodings = {"identity": body}
+    if len(body) >= RESPONSE_CACHE_MIN_COMPRESS_BYTES:
+        encodings["gzip"] = gzip.compress(body, compresslevel=RESPONSE_CACHE_GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            encodings["br"] = brotli.compress(body, mode=brotli.MODE_TEXT, quality=RESPONSE_CACHE_BROTLI_QUALITY)
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """Preferred available coding (br, then gzip) the Accept-Encoding header allows"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+    for coding in ("br", "gzip"):
+        if coding in available and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+class ResponseCache:
+    """
+    LRU of serialized content responses keyed by path, declared query
+    parameters and content ETag, each stored with its precompressed
+    encodings. A hit writes the stored bytes for the client's
+    Accept-Encoding: no JSON encoding or compression per request. Entries of
+    older versions are never hit again and age out; entries older than `ttl`
+    seconds are rebuilt.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()  # key -> (stored_at, (encodings, headers))
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        stored = self.entries.get(key)
+        if stored is None or time.monotonic() - stored[0] >= self.ttl:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return stored[1]
+
+    def put(self, key: tuple, entry: tuple) -> None:
+        self.entries[key] = (time.monotonic(), entry)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stored: Counter = Counter()
+        for _, (encodings, _) in self.entries.values():
+            for coding, body in encodings.items():
+                stored[coding] += len(body)
+        return {
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "brotli": brotli is not None,
+            "bytes": dict(stored),
+        }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+
+
+def build_cache_entry(response: Response, cache_control: str) -> tuple:
+    headers = {
+        "Content-Type": response.headers.get("content-type", "application/json"),
+        "Cache-Control": response.headers.get("cache-control", cache_control),
+    }
+    return compress_encodings(response.body), headers
+
+
+def cached_response(entry: tuple, etag: str, accept_encoding: str) -> Response:
+    encodings, headers = entry
+    coding = negotiate_encoding(accept_encoding, encodings)
+    headers = {**headers, "ETag": etag, "Vary": "Accept-Encoding"}
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(content=encodings[coding], headers=headers)
+
+
+class ConditionalGetRoute(APIRoute):
+    """
+    Adds ETag validation to GET routes. Content routes (CONTENT_ROUTE_COLLECTIONS)
+    answer If-None-Match with 304 from the version counters alone, before the
+    handler runs, and are cacheable with stale-while-revalidate; their bodies
+    are served from the precompressed response cache. Other JSON
+    routes get an ETag hashed from the body: a 304 then saves bandwidth, not
+    work. Streaming responses are left alone. Writes to content routes bump
+    the versions.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        collections = CONTENT_ROUTE_COLLECTIONS.get(self.path_format.removeprefix("/api/").split("/")[0])
+        # Only parameters the handler reads can change the body; keying on
+        # anything else would let clients fill the cache with duplicates
+        declared_params = {param.alias for param in get_flat_dependant(self.dependant).query_params}
+
+        if "GET" not in self.methods:
+            if not collections:
+                return handler
+
+            async def write_handler(request: Request) -> Response:
+                response = await handler(request)
+                if response.status_code < 400:
+                    try:
+                        await content_versions.bump(collections)
+                    except Exception as e:
+                        # The write is committed: retrying it could create a
+                        # duplicate, so retry the bump instead
+                        logger.error(f"Failed to bump content versions for {request.url.path}, retrying in the background: {e}")
+                        content_versions.bump_later(collections)
+                return response
+            return write_handler
+
+        async def conditional_handler(request: Request) -> Response:
+            if_none_match = request.headers.get("if-none-match")
+            if collections:
+                # Read the version before the handler: a write racing with it
+                # can only make the ETag older than the body, never newer
+                await content_versions.refresh()
+                etag = content_versions.etag(collections)
+                if etag is None:
+                    # A write here is not reflected in the versions yet:
+                    # neither validate nor cache until its bump goes through
+                    response = await handler(request)
+                    response.headers.setdefault("Cache-Control", "no-cache")
+                    return response
+                cache_control = f"public, max-age={CONTENT_MAX_AGE_SECONDS}, stale-while-revalidate={CONTENT_STALE_WHILE_REVALIDATE_SECONDS}"
+                if etag_matches(if_none_match, etag):
+                    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"})
+                params = tuple(sorted(item for item in request.query_params.multi_items() if item[0] in declared_params))
+                key = (request.url.path, params, etag)
+                entry = response_cache.get(key)
+                if entry is None:
+                    response = await handler(request)
+                    # no-store marks a degraded response that must not outlive this request
+                    if (response.status_code != 200 or isinstance(response, StreamingResponse)
+                            or "no-store" in response.headers.get("cache-control", "")):
+                        return response
+                    entry = await asyncio.to_thread(build_cache_entry, response, cache_control)
+                    response_cache.put(key, entry)
+                return cached_response(entry, etag, request.headers.get("accept-encoding", ""))
+            else:
+                response = await handler(request)
+                if response.status_code != 200 or isinstance(response, StreamingResponse):
+                    return response
+                etag = f'W/"{hashlib.blake2b(response.body, digest_size=12).hexdigest()}"'
+                cache_control = "no-cache"
+                if etag_matches(if_none_match, etag):
+                    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+            response.headers["ETag"] = etag
+            response.headers.setdefault("Cache-Control", cache_control)
+            return response
+        return conditional_handler
+
+
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=ConditionalGetRoute)
 
 
 # Define Models
@@ -712,11 +1091,99 @@ async def reorder_team_members(order_data: List[dict]):
     return {"message": "Team members reordered successfully"}
 
 
+# ==================== SETTINGS CACHE ====================
+
+SETTINGS_CACHE_TTL_SECONDS = float(os.environ.get('SETTINGS_CACHE_TTL_SECONDS', '300'))
+
+
+class SettingsCache:
+    """
+    Read-through cache for the settings singletons, keyed by singleton id.
+    An entry is served from memory while the content versions of its
+    collections are unchanged (at most `ttl` seconds), so edits made on any
+    worker show up after the next version check. Concurrent misses share one
+    load, and write handlers also invalidate their key so this worker sees
+    its own edits at once. Cached values are shared between requests:
+    read-only.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries: Dict[str, tuple] = {}  # key -> (loaded_at, version stamp, value)
+        self.loads: Dict[str, asyncio.Task] = {}
+        self.generations: Counter = Counter()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, load, collections: tuple) -> Any:
+        await content_versions.refresh()
+        stamp = content_versions.stamp(collections)
+        if stamp is None:
+            self.misses += 1
+            return await load()
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] == stamp and time.monotonic() - entry[0] < self.ttl:
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        task = self.loads.get(key)
+        if task is None:
+            task = self.loads[key] = asyncio.create_task(self.fill(key, load, stamp))
+        # A caller that goes away must not cancel the load other callers wait on
+        return await asyncio.shield(task)
+
+    async def fill(self, key: str, load, stamp: str) -> Any:
+        generation = self.generations[key]
+        try:
+            value = await load()
+        finally:
+            if self.loads.get(key) is asyncio.current_task():
+                del self.loads[key]
+        # Skip storing if the key was invalidated while loading. The stamp is
+        # the one read before loading, so a concurrent write elsewhere only
+        # makes the entry look older than it is.
+        if self.generations[key] == generation:
+            self.entries[key] = (time.monotonic(), stamp, value)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        self.generations[key] += 1
+        self.entries.pop(key, None)
+        self.loads.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": {key: {"age_seconds": round(now - loaded_at, 1)} for key, (loaded_at, _, _) in self.entries.items()},
+        }
+
+
+settings_cache = SettingsCache(SETTINGS_CACHE_TTL_SECONDS)
+
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit ratio and entry age of the in-process content caches"""
+    return {
+        "settings": settings_cache.stats(),
+        "responses": response_cache.stats(),
+        "content_versions": content_versions.stats(),
+    }
+
+
 # ==================== PLATFORM SETTINGS API ====================
 
 @api_router.get("/platform-settings")
 async def get_platform_settings():
     """Get platform settings or return defaults"""
+    return await settings_cache.get("platform_settings", load_platform_settings, CONTENT_ROUTE_COLLECTIONS["platform-settings"])
+
+async def load_platform_settings():
     collection = db["platform_settings"]
     settings = await collection.find_one({"id": "platform_settings"}, {"_id": 0})
     
@@ -761,6 +1228,7 @@ async def update_platform_settings(update_data: PlatformSettingsUpdate):
             {"$set": update_dict}
         )
     
+    settings_cache.invalidate("platform_settings")
     updated = await collection.find_one({"id": "platform_settings"}, {"_id": 0})
     return updated
 
@@ -775,6 +1243,7 @@ async def update_single_stat(stat_name: str, stat_data: PlatformStat):
         {"id": "platform_settings"},
         {"$set": {stat_name: stat_data.model_dump(), "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    settings_cache.invalidate("platform_settings")
     return {"message": f"{stat_name} updated successfully"}
 
 @api_router.patch("/platform-settings/modules")
@@ -785,6 +1254,7 @@ async def update_service_modules(modules: List[ServiceModule]):
         {"id": "platform_settings"},
         {"$set": {"service_modules": [m.model_dump() for m in modules], "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    settings_cache.invalidate("platform_settings")
     return {"message": "Service modules updated successfully"}
 
 @api_router.patch("/platform-settings/services")
@@ -795,6 +1265,7 @@ async def update_services_list(services: List[ServiceItem]):
         {"id": "platform_settings"},
         {"$set": {"services_list": [s.model_dump() for s in services], "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    settings_cache.invalidate("platform_settings")
     return {"message": "Services list updated successfully"}
 
 @api_router.patch("/platform-settings/bottom-stats")
@@ -805,6 +1276,7 @@ async def update_bottom_stats(stats: List[BottomStat]):
         {"id": "platform_settings"},
         {"$set": {"bottom_stats": [s.model_dump() for s in stats], "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    settings_cache.invalidate("platform_settings")
     return {"message": "Bottom stats updated successfully"}
 
 
@@ -813,6 +1285,9 @@ async def update_bottom_stats(stats: List[BottomStat]):
 @api_router.get("/roadmap")
 async def get_roadmap():
     """Get roadmap settings and tasks"""
+    return await settings_cache.get("roadmap", load_roadmap, CONTENT_ROUTE_COLLECTIONS["roadmap"])
+
+async def load_roadmap():
     try:
         # Get settings
         settings_collection = db["roadmap_settings"]
@@ -855,6 +1330,7 @@ async def update_roadmap(update_data: dict):
             {"id": "roadmap_settings"},
             {"$set": update_dict}
         )
+        settings_cache.invalidate("roadmap")
     
     return await collection.find_one({"id": "roadmap_settings"}, {"_id": 0})
 
@@ -884,6 +1360,7 @@ async def add_roadmap_task(task: RoadmapTaskCreate):
         },
         upsert=True
     )
+    settings_cache.invalidate("roadmap")
     
     return new_task
 
@@ -903,6 +1380,7 @@ async def update_roadmap_task(task_id: str, update_data: RoadmapTaskUpdate):
             {"id": "roadmap_settings", "tasks.id": task_id},
             {"$set": update_dict}
         )
+        settings_cache.invalidate("roadmap")
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Task not found")
     
@@ -920,6 +1398,7 @@ async def delete_roadmap_task(task_id: str):
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
         }
     )
+    settings_cache.invalidate("roadmap")
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -948,6 +1427,7 @@ async def reorder_roadmap_tasks(order_data: List[dict]):
         {"id": "roadmap_settings"},
         {"$set": {"tasks": tasks, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    settings_cache.invalidate("roadmap")
     
     return {"message": "Tasks reordered successfully"}
 
@@ -1061,6 +1541,9 @@ async def reorder_partners(order_data: List[dict]):
 @api_router.get("/footer-settings")
 async def get_footer_settings():
     """Get footer settings or return defaults"""
+    return await settings_cache.get("footer_settings", load_footer_settings, CONTENT_ROUTE_COLLECTIONS["footer-settings"])
+
+async def load_footer_settings():
     collection = db["footer_settings"]
     settings = await collection.find_one({"id": "footer_settings"}, {"_id": 0})
     
@@ -1107,6 +1590,7 @@ async def update_footer_settings(update_data: FooterSettingsUpdate):
             {"$set": update_dict}
         )
     
+    settings_cache.invalidate("footer_settings")
     updated = await collection.find_one({"id": "footer_settings"}, {"_id": 0})
     return updated
 
@@ -1183,6 +1667,9 @@ async def delete_faq_item(item_id: str):
 @api_router.get("/community-settings")
 async def get_community_settings():
     """Get community settings or return defaults"""
+    return await settings_cache.get("community_settings", load_community_settings, CONTENT_ROUTE_COLLECTIONS["community-settings"])
+
+async def load_community_settings():
     collection = db["community_settings"]
     settings = await collection.find_one({"id": "community_settings"}, {"_id": 0})
     
@@ -1227,6 +1714,7 @@ async def update_community_settings(update_data: CommunitySettingsUpdate):
             {"$set": update_dict}
         )
     
+    settings_cache.invalidate("community_settings")
     updated = await collection.find_one({"id": "community_settings"}, {"_id": 0})
     return updated
 
@@ -1236,6 +1724,9 @@ async def update_community_settings(update_data: CommunitySettingsUpdate):
 @api_router.get("/hero-settings")
 async def get_hero_settings():
     """Get hero section settings including stats and NFT settings"""
+    return await settings_cache.get("hero_settings", load_hero_settings, CONTENT_ROUTE_COLLECTIONS["hero-settings"])
+
+async def load_hero_settings():
     collection = db.hero_settings
     settings = await collection.find_one({"id": "hero_settings"}, {"_id": 0})
     
@@ -1244,7 +1735,7 @@ async def get_hero_settings():
         default_settings = HeroSettings()
         settings_dict = default_settings.model_dump()
         settings_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await collection.insert_one(settings_dict)
+        await collection.insert_one(settings_dict.copy())
         return settings_dict
     
     return settings
@@ -1278,6 +1769,7 @@ async def update_hero_settings(update_data: HeroSettingsUpdate):
             {"$set": update_dict}
         )
     
+    settings_cache.invalidate("hero_settings")
     updated = await collection.find_one({"id": "hero_settings"}, {"_id": 0})
     return updated
 
@@ -1288,13 +1780,16 @@ async def update_hero_settings(update_data: HeroSettingsUpdate):
 @api_router.get("/about-settings")
 async def get_about_settings():
     """Get About section settings"""
+    return await settings_cache.get("about_settings", load_about_settings, CONTENT_ROUTE_COLLECTIONS["about-settings"])
+
+async def load_about_settings():
     collection = db.about_settings
     settings = await collection.find_one({"id": "about_settings"}, {"_id": 0})
     
     if not settings:
         # Create default settings
         default_settings = AboutSettings().model_dump()
-        await collection.insert_one(default_settings)
+        await collection.insert_one(default_settings.copy())
         settings = default_settings
     
     return settings
@@ -1323,6 +1818,7 @@ async def update_about_settings(settings_update: AboutSettingsUpdate):
         new_settings.update(update_dict)
         await collection.insert_one(new_settings)
     
+    settings_cache.invalidate("about_settings")
     updated = await collection.find_one({"id": "about_settings"}, {"_id": 0})
     return updated
 
@@ -1407,6 +1903,9 @@ class AnalyticsEvent(BaseModel):
     conversion_type: Optional[str] = None  # registration, purchase, etc.
     conversion_value: Optional[float] = None
 
+    # Sampling: how many events this one stands for (1 / sampling rate)
+    sample_weight: float = 1.0
+
 class AnalyticsEventCreate(BaseModel):
     session_id: str
     event_type: str
@@ -1424,6 +1923,7 @@ class AnalyticsStats(BaseModel):
     # Overview stats
     page_views: int = 0
     unique_sessions: int = 0
+    unique_sessions_error: float = 0.0  # relative standard error of the estimate
     button_clicks: int = 0
     conversions: int = 0
     conversion_rate: float = 0.0
@@ -1446,6 +1946,9 @@ class AnalyticsStats(BaseModel):
     # Geography
     top_countries: List[Dict[str, Any]] = []
     top_cities: List[Dict[str, Any]] = []
+
+    # Content
+    top_pages: List[Dict[str, Any]] = []
     
     # Traffic sources
     direct_traffic: int = 0
@@ -1459,8 +1962,40 @@ class AnalyticsStats(BaseModel):
 
 # ==================== ANALYTICS HELPER FUNCTIONS ====================
 
-def parse_user_agent(user_agent_string: str) -> Dict[str, str]:
-    """Parse user agent string to extract device, browser, and OS info"""
+ANALYTICS_ENRICHMENT_CACHE_SIZE = int(os.environ.get('ANALYTICS_ENRICHMENT_CACHE_SIZE', '4096'))
+
+# Registrable domain label -> search engine name. A host matches when the
+# label is followed by a public suffix only, so www.google.com, google.co.uk
+# and news.google.de resolve here but google.evil.com does not.
+SEARCH_ENGINE_LABELS = {
+    "google": "Google",
+    "bing": "Bing",
+    "yahoo": "Yahoo",
+    "duckduckgo": "Duckduckgo",
+    "yandex": "Yandex",
+    "baidu": "Baidu",
+}
+
+# Public suffixes engines are registered under: generic TLDs, any
+# two-letter country TLD, and the second-level zones countries sell under
+PUBLIC_SUFFIX_TLDS = {"com", "net", "org", "info", "biz"}
+PUBLIC_SUFFIX_SECOND_LEVEL = {"co", "com", "net", "org", "ac", "gov", "edu", "ne", "or"}
+
+
+# HTTP libraries and headless browsers that user_agents does not flag as bots
+AUTOMATION_BROWSER_FAMILIES = {
+    "curl", "Wget", "Python Requests", "Python-urllib", "Go-http-client",
+    "Apache-HttpClient", "okhttp", "HeadlessChrome", "PhantomJS",
+}
+
+
+@lru_cache(maxsize=ANALYTICS_ENRICHMENT_CACHE_SIZE)
+def classify_user_agent(user_agent_string: str) -> tuple:
+    """
+    (device_type, browser, os, bot) for a user agent string, where bot is the
+    crawler or automation client name, or None for browsers. Memoized, real
+    traffic has few distinct UAs.
+    """
     try:
         ua = user_agents.parse(user_agent_string)
         
@@ -1472,295 +2007,2688 @@ def parse_user_agent(user_agent_string: str) -> Dict[str, str]:
         else:
             device_type = "desktop"
         
-        return {
-            "device_type": device_type,
-            "browser": ua.browser.family if ua.browser.family else "Unknown",
-            "os": ua.os.family if ua.os.family else "Unknown"
-        }
+        browser = ua.browser.family if ua.browser.family else "Unknown"
+        return (
+            device_type,
+            browser,
+            ua.os.family if ua.os.family else "Unknown",
+            browser if ua.is_bot or browser in AUTOMATION_BROWSER_FAMILIES else None
+        )
     except Exception:
-        return {
-            "device_type": "desktop",
-            "browser": "Unknown",
-            "os": "Unknown"
-        }
+        return ("desktop", "Unknown", "Unknown", None)
+
+def parse_user_agent(user_agent_string: str) -> Dict[str, str]:
+    """Parse user agent string to extract device, browser, and OS info"""
+    device_type, browser, os_family, _ = classify_user_agent(user_agent_string or "")
+    return {"device_type": device_type, "browser": browser, "os": os_family}
+
+def detect_bot(user_agent_string: str) -> Optional[str]:
+    """Crawler or automation client name for a user agent, None for browsers"""
+    return classify_user_agent(user_agent_string or "")[3]
+
+def is_public_suffix(labels: List[str]) -> bool:
+    if len(labels) == 1:
+        return labels[0] in PUBLIC_SUFFIX_TLDS or len(labels[0]) == 2
+    return len(labels) == 2 and labels[0] in PUBLIC_SUFFIX_SECOND_LEVEL and len(labels[1]) == 2
+
+@lru_cache(maxsize=ANALYTICS_ENRICHMENT_CACHE_SIZE)
+def classify_referrer_host(host: str) -> Optional[str]:
+    """Search engine name for a referrer host, or None for regular sites; memoized"""
+    labels = host.lower().rstrip(".").split(".")
+    for index, label in enumerate(labels[:-1]):
+        engine = SEARCH_ENGINE_LABELS.get(label)
+        if engine and is_public_suffix(labels[index + 1:]):
+            return engine
+    return None
+
+def classify_referrer(referrer: str) -> tuple:
+    """(traffic_source, source_detail) for a non-empty referrer"""
+    try:
+        parsed = urlparse(referrer if "//" in referrer else f"//{referrer}")
+        host = parsed.hostname or ""
+    except Exception:
+        return ("referral", referrer)
+    
+    engine = classify_referrer_host(host)
+    if engine:
+        return ("search", engine)
+    return ("referral", parsed.netloc or referrer)
 
 def determine_traffic_source(referrer: Optional[str]) -> Dict[str, str]:
     """Determine traffic source from referrer"""
     if not referrer or referrer == "":
         return {"traffic_source": "direct", "source_detail": "Direct"}
     
-    # Check if it's a search engine
-    search_engines = ["google", "bing", "yahoo", "duckduckgo", "yandex", "baidu"]
-    referrer_lower = referrer.lower()
-    
-    for engine in search_engines:
-        if engine in referrer_lower:
-            return {"traffic_source": "search", "source_detail": engine.capitalize()}
-    
-    # Extract domain from referrer
+    traffic_source, source_detail = classify_referrer(referrer)
+    return {"traffic_source": traffic_source, "source_detail": source_detail}
+
+def enrichment_cache_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {}
+    for name, cached in (("user_agent", classify_user_agent), ("referrer", classify_referrer_host), ("geoip", lookup_ip_location)):
+        info = cached.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_ratio": round(info.hits / lookups, 4) if lookups else 0.0,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+        }
+    return stats
+
+
+# ==================== GEOIP RESOLUTION ====================
+
+# Binary IPv4 range table built by build_geoip_table.py (layout documented
+# there). It is memory-mapped once, so lookups are a binary search over the
+# page cache with no network call and no per-request file I/O.
+GEOIP_TABLE_PATH = os.environ.get('GEOIP_TABLE_PATH', str(ROOT_DIR / "geoip.bin"))
+GEOIP_CACHE_SIZE = int(os.environ.get('GEOIP_CACHE_SIZE', '65536'))
+GEOIP_MAGIC = b"GEO1"
+GEOIP_HEADER = struct.Struct("<4sII")
+UNKNOWN_LOCATION = ("Unknown", "Unknown")
+
+
+class GeoIPTable:
+    """Read-only view over a memory-mapped GeoIP table"""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < GEOIP_HEADER.size:
+            raise ValueError("GeoIP table is truncated")
+        magic, self.count, self.location_count = GEOIP_HEADER.unpack_from(self.map, 0)
+        if magic != GEOIP_MAGIC:
+            raise ValueError("Not a GeoIP table")
+
+        self.starts = GEOIP_HEADER.size
+        self.ends = self.starts + 4 * self.count
+        self.locations = self.ends + 4 * self.count
+        self.offsets = self.locations + 4 * self.count
+        self.blob = self.offsets + 4 * (self.location_count + 1)
+        if len(self.map) < self.blob or len(self.map) < self.blob + self.uint32(self.offsets, self.location_count):
+            raise ValueError("GeoIP table is truncated")
+
+    def uint32(self, base: int, index: int) -> int:
+        return struct.unpack_from("<I", self.map, base + 4 * index)[0]
+
+    def lookup(self, address: int) -> Optional[tuple]:
+        """(country, city) of the range containing the address, if any"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.uint32(self.starts, middle) <= address:
+                low = middle + 1
+            else:
+                high = middle
+        index = low - 1
+        if index < 0 or address > self.uint32(self.ends, index):
+            return None
+
+        location = self.uint32(self.locations, index)
+        start, end = self.uint32(self.offsets, location), self.uint32(self.offsets, location + 1)
+        country, _, city = self.map[self.blob + start:self.blob + end].decode("utf-8").partition("\t")
+        return country or "Unknown", city or "Unknown"
+
+    def close(self) -> None:
+        self.map.close()
+
+
+geoip_table: Optional[GeoIPTable] = None
+
+
+def load_geoip_table(path: str = GEOIP_TABLE_PATH) -> bool:
+    """Map the GeoIP table if present; without it every location stays Unknown"""
+    global geoip_table
+    if not Path(path).exists():
+        logger.info(f"No GeoIP table at {path}; analytics locations will be Unknown")
+        return False
     try:
-        from urllib.parse import urlparse
-        domain = urlparse(referrer).netloc
-        return {"traffic_source": "referral", "source_detail": domain}
-    except Exception:
-        return {"traffic_source": "referral", "source_detail": referrer}
+        table = GeoIPTable(Path(path))
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load GeoIP table {path}: {e}")
+        return False
+
+    previous, geoip_table = geoip_table, table
+    lookup_ip_location.cache_clear()
+    if previous:
+        previous.close()
+    logger.info(f"Loaded GeoIP table {path} ({table.count} ranges)")
+    return True
+
+
+@lru_cache(maxsize=GEOIP_CACHE_SIZE)
+def lookup_ip_location(ip_address: str) -> tuple:
+    """(country, city) for an IPv4 (or IPv4-mapped IPv6) address"""
+    if geoip_table is None:
+        return UNKNOWN_LOCATION
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return UNKNOWN_LOCATION
+    if address.version == 6:
+        address = address.ipv4_mapped
+        if address is None:
+            return UNKNOWN_LOCATION
+    if not address.is_global:
+        return UNKNOWN_LOCATION
+    return geoip_table.lookup(int(address)) or UNKNOWN_LOCATION
+
+
+# Networks of the reverse proxies in front of the app (comma-separated
+# CIDRs). Forwarding headers are only believed from these peers, and
+# X-Forwarded-For hops they appended are skipped.
+TRUSTED_PROXY_NETWORKS = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in os.environ.get(
+        'TRUSTED_PROXIES', '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+    ).split(",")
+    if network.strip()
+]
+
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXY_NETWORKS)
 
 
-# ==================== ANALYTICS API ====================
+def client_ip(request: Request) -> str:
+    """
+    Originating client address. When the socket peer is a trusted proxy,
+    X-Forwarded-For is walked from the right and the first hop not added by
+    a trusted proxy wins (the leftmost hops are whatever the client sent),
+    then X-Real-IP; otherwise the peer itself.
+    """
+    peer = request.client.host if request.client else "Unknown"
+    if not is_trusted_proxy(peer):
+        return peer
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not is_trusted_proxy(hop):
+                return hop
+        if hops:
+            return hops[0]
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip:
+        return real_ip.strip()
+    return peer
 
-@api_router.post("/analytics/track")
-async def track_analytics_event(event_data: AnalyticsEventCreate, request: Request):
+
+# ==================== ANALYTICS ROLLUPS ====================
+
+# Hour and day buckets are written by analytics_store.py; this section reads
+# them back.
+
+# Events reach the rollups from the write-behind buffer, so a bucket keeps
+# receiving flushes for a while after its hour is over
+ROLLUP_SETTLE_SECONDS = 300
+
+
+def closed_rollup_cutoff() -> datetime:
+    """Start of the oldest hour bucket live flushes may still write to"""
+    return rollup_bucket_start(datetime.now(timezone.utc) - timedelta(seconds=ROLLUP_SETTLE_SECONDS), "hour")
+
+
+def closed_rollup_buckets(cutoff: datetime) -> Dict[str, Any]:
+    """Query for the hour and day buckets that lie entirely before `cutoff`"""
+    return {"$or": [
+        {"granularity": "hour", "bucket": {"$lt": cutoff}},
+        {"granularity": "day", "bucket": {"$lt": rollup_bucket_start(cutoff, "day")}},
+    ]}
+
+
+def rollup_range_query(start: datetime, end: datetime) -> Dict[str, Any]:
     """
-    Track an analytics event (pageview, click, conversion, etc.)
+    Select the buckets covering [start, end]: day buckets for whole days and
+    hour buckets for the partial days at either edge, so a period of N days
+    reads at most N + 48 documents. The first day's compacted day bucket is
+    selected too, for when retention has pruned its hour buckets; see
+    drop_shadowed_day_buckets.
     """
-    # Parse user agent
-    user_agent_str = event_data.user_agent or request.headers.get("user-agent", "")
-    ua_info = parse_user_agent(user_agent_str)
-    
-    # Determine traffic source
-    traffic_info = determine_traffic_source(event_data.referrer)
-    
-    # Get IP address (simplified - in production use proper IP extraction)
-    ip_address = request.client.host if request.client else "Unknown"
-    
-    # Create event
-    event = AnalyticsEvent(
-        **event_data.model_dump(),
-        user_agent=user_agent_str,
-        device_type=ua_info["device_type"],
-        browser=ua_info["browser"],
-        os=ua_info["os"],
-        traffic_source=traffic_info["traffic_source"],
-        source_detail=traffic_info["source_detail"],
-        ip_address=ip_address,
-        # Location would be determined via IP geolocation service in production
-        country="Unknown",
-        city="Unknown"
-    )
-    
-    # Check if returning visitor
-    existing_session = await db.analytics_events.find_one({
-        "session_id": event_data.session_id,
-        "event_type": "pageview"
-    })
-    
-    if existing_session:
-        event.is_returning = True
-        event.is_new_visitor = False
-    
-    # Save to database
-    doc = event.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    await db.analytics_events.insert_one(doc)
-    
-    return {"success": True, "event_id": event.id}
+    start_hour = rollup_bucket_start(as_utc(start), "hour")
+    end = as_utc(end)
+    first_day = rollup_bucket_start(start_hour, "day")
+    if first_day < start_hour:
+        first_day += timedelta(days=1)
+    last_day = rollup_bucket_start(end, "day")
 
+    if first_day >= last_day:
+        return {"granularity": "hour", "bucket": {"$gte": start_hour, "$lte": end}}
 
-@api_router.get("/analytics/stats")
-async def get_analytics_stats(period: int = 30):
+    return {"$or": [
+        {"granularity": "day", "bucket": {"$gte": first_day, "$lt": last_day}},
+        {"granularity": "hour", "bucket": {"$gte": start_hour, "$lt": first_day}},
+        {"granularity": "hour", "bucket": {"$gte": last_day, "$lte": end}},
+        {"granularity": "day", "bucket": rollup_bucket_start(start_hour, "day"), "compacted": True},
+    ]}
+
+
+def drop_shadowed_day_buckets(buckets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Get analytics statistics for a given period (days)
-    period: 7, 30, or 90 days
+    Keep a day bucket only when none of its hour buckets were selected. The
+    only day bucket that can overlap hour buckets is the first partial day's,
+    and it stands in for them once retention has deleted them (counting the
+    whole day rather than losing it).
     """
-    # Calculate date range
-    end_date = datetime.now(timezone.utc)
-    start_date = end_date - timedelta(days=period)
-    
-    # Query events in period
-    events = await db.analytics_events.find({
-        "timestamp": {
-            "$gte": start_date.isoformat(),
-            "$lte": end_date.isoformat()
-        }
-    }, {"_id": 0}).to_list(100000)
-    
-    if not events:
-        return AnalyticsStats()
-    
-    # Initialize stats
-    stats = AnalyticsStats()
-    
-    # Track unique sessions
-    unique_sessions = set()
-    session_durations = []
-    countries = defaultdict(int)
-    cities = defaultdict(int)
-    devices = defaultdict(int)
-    traffic_sources = defaultdict(int)
-    source_details = defaultdict(int)
-    new_visitors = 0
-    returning_visitors = 0
-    
-    # Process events
-    for event in events:
-        session_id = event.get("session_id")
-        event_type = event.get("event_type")
-        
-        # Count unique sessions
-        if session_id:
-            unique_sessions.add(session_id)
-        
-        # Page views
-        if event_type == "pageview":
-            stats.page_views += 1
-            
-            # Visitor type
-            if event.get("is_new_visitor"):
-                new_visitors += 1
-            if event.get("is_returning"):
-                returning_visitors += 1
-        
-        # Button clicks
-        if event_type == "click":
-            stats.button_clicks += 1
-        
-        # Conversions
-        if event_type == "conversion":
-            stats.conversions += 1
-        
-        # Session duration
-        if event.get("session_duration"):
-            session_durations.append(event["session_duration"])
-        
-        # Device tracking
-        device = event.get("device_type", "desktop")
-        devices[device] += 1
-        
-        # Geography
-        country = event.get("country", "Unknown")
-        city = event.get("city", "Unknown")
-        if country != "Unknown":
-            countries[country] += 1
-        if city != "Unknown":
-            cities[city] += 1
-        
-        # Traffic sources
-        traffic_source = event.get("traffic_source", "direct")
-        source_detail = event.get("source_detail", "Direct")
-        traffic_sources[traffic_source] += 1
-        source_details[source_detail] += 1
-    
-    # Calculate metrics
-    stats.unique_sessions = len(unique_sessions)
-    
-    # Conversion rate
-    if stats.unique_sessions > 0:
-        stats.conversion_rate = round((stats.conversions / stats.unique_sessions) * 100, 2)
-    
-    # Average session duration
-    if session_durations:
-        stats.avg_session_duration = int(sum(session_durations) / len(session_durations))
-    
-    # Visitor types
-    total_visitors = new_visitors + returning_visitors
-    if total_visitors > 0:
-        stats.new_visitors = new_visitors
-        stats.returning_visitors = returning_visitors
-        stats.new_visitors_percent = round((new_visitors / total_visitors) * 100, 2)
-        stats.returning_visitors_percent = round((returning_visitors / total_visitors) * 100, 2)
-    
-    # Device breakdown
-    total_device_events = sum(devices.values())
-    if total_device_events > 0:
-        stats.desktop_visitors = devices.get("desktop", 0)
-        stats.mobile_visitors = devices.get("mobile", 0)
-        stats.tablet_visitors = devices.get("tablet", 0)
-        stats.desktop_percent = round((stats.desktop_visitors / total_device_events) * 100, 2)
-        stats.mobile_percent = round((stats.mobile_visitors / total_device_events) * 100, 2)
-        stats.tablet_percent = round((stats.tablet_visitors / total_device_events) * 100, 2)
-    
-    # Top countries
-    stats.top_countries = [
-        {"name": country, "count": count}
-        for country, count in sorted(countries.items(), key=lambda x: x[1], reverse=True)[:10]
-    ]
-    
-    # Top cities
-    stats.top_cities = [
-        {"name": city, "count": count}
-        for city, count in sorted(cities.items(), key=lambda x: x[1], reverse=True)[:10]
-    ]
-    
-    # Traffic sources
-    total_traffic = sum(traffic_sources.values())
-    if total_traffic > 0:
-        stats.direct_traffic = traffic_sources.get("direct", 0)
-        stats.referral_traffic = traffic_sources.get("referral", 0)
-        stats.search_traffic = traffic_sources.get("search", 0)
-        stats.direct_percent = round((stats.direct_traffic / total_traffic) * 100, 2)
-        stats.referral_percent = round((stats.referral_traffic / total_traffic) * 100, 2)
-        stats.search_percent = round((stats.search_traffic / total_traffic) * 100, 2)
-    
-    # Detailed sources
-    stats.detailed_sources = [
-        {"source": source, "count": count, "percent": round((count / total_traffic) * 100, 2)}
-        for source, count in sorted(source_details.items(), key=lambda x: x[1], reverse=True)[:10]
+    hour_days = {rollup_bucket_start(as_utc(bucket["bucket"]), "day") for bucket in buckets if bucket["granularity"] == "hour"}
+    return [
+        bucket for bucket in buckets
+        if bucket["granularity"] == "hour" or as_utc(bucket["bucket"]) not in hour_days
     ]
-    
-    return stats
 
 
-@api_router.delete("/analytics/clear")
-async def clear_analytics_data():
-    """Clear all analytics data (admin only)"""
-    result = await db.analytics_events.delete_many({})
-    return {"success": True, "deleted_count": result.deleted_count}
+def merge_rollup_buckets(buckets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum counters and dimension maps and merge the session sketches across rollup buckets"""
+    merged: Dict[str, Any] = {counter: 0 for counter in ROLLUP_COUNTERS}
+    for dimension in ROLLUP_DIMENSIONS:
+        merged[dimension] = SpaceSaving() if dimension in ROLLUP_TOPK_DIMENSIONS else defaultdict(int)
+    merged["sessions"] = HyperLogLog()
+
+    for bucket in buckets:
+        merged["sessions"].merge_sparse(bucket.get("hll") or {})
+        for counter in ROLLUP_COUNTERS:
+            merged[counter] += bucket.get(counter, 0)
+        if "sampled_events" not in bucket:
+            # Bucket written before sampling: every event had weight 1
+            merged["sampled_events"] += bucket.get("events", 0)
+        topk = bucket.get("topk") or {}
+        for dimension in ROLLUP_DIMENSIONS:
+            if dimension not in ROLLUP_TOPK_DIMENSIONS:
+                for key, count in (bucket.get(dimension) or {}).items():
+                    merged[dimension][decode_rollup_key(key)] += count
+            elif dimension in topk:
+                merged[dimension].merge(SpaceSaving.from_document(topk[dimension]))
+            elif bucket.get(dimension):
+                # Bucket written before top-K summaries: exact counter map
+                merged[dimension].merge(SpaceSaving.from_counts(
+                    {decode_rollup_key(key): count for key, count in bucket[dimension].items()}
+                ))
+
+    return merged
+
+
+def top_counts(counts: Dict[str, int], label: str = "name", limit: int = 10, exclude: tuple = ("Unknown",)) -> List[Dict[str, Any]]:
+    ranked = sorted(
+        ((value, count) for value, count in counts.items() if value not in exclude),
+        key=lambda x: (-x[1], x[0])
+    )
+    return [{label: value, "count": int(round(count))} for value, count in ranked[:limit]]
 
 
-# ==================== EXISTING ROUTES ====================
+# ==================== ANALYTICS SESSIONS ====================
 
-@api_router.get("/")
-async def root():
-    return {"message": "Hello World"}
+ANALYTICS_SESSION_CACHE_SIZE = int(os.environ.get('ANALYTICS_SESSION_CACHE_SIZE', '100000'))
+ANALYTICS_SESSION_CACHE_TTL_SECONDS = float(os.environ.get('ANALYTICS_SESSION_CACHE_TTL_SECONDS', '30'))
 
-@api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.model_dump()
-    status_obj = StatusCheck(**status_dict)
-    doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    _ = await db.status_checks.insert_one(doc)
-    return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    return status_checks
+class AnalyticsSessionIndex:
+    """
+    LRU of session_id -> pageviews seen, backed by the analytics_sessions
+    collection (unique index on session_id). Answers "has this session
+    already had a pageview?" without touching analytics_events. Entries
+    older than `ttl` seconds are reloaded, so pageviews handled by other
+    workers are picked up.
+    """
 
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.pageviews: OrderedDict = OrderedDict()  # session_id -> (pageviews, loaded_at)
+
+    def remember(self, session_id: str, pageviews: int, loaded_at: float) -> None:
+        self.pageviews[session_id] = (pageviews, loaded_at)
+        self.pageviews.move_to_end(session_id)
+        while len(self.pageviews) > self.capacity:
+            self.pageviews.popitem(last=False)
+
+    async def load(self, session_ids: List[str]) -> None:
+        """Pull sessions missing from the LRU, or due for revalidation, with one indexed lookup"""
+        now = time.monotonic()
+        missing = [
+            session_id for session_id in set(session_ids)
+            if session_id not in self.pageviews or now - self.pageviews[session_id][1] >= self.ttl
+        ]
+        if not missing:
+            return
+        try:
+            docs = await db.analytics_sessions.find(
+                {"session_id": {"$in": missing}},
+                {"_id": 0, "session_id": 1, "pageviews": 1}
+            ).to_list(None)
+        except PyMongoError as e:
+            # Tracking must not fail on this lookup: fall back to what this
+            # worker has seen, and retry the lookup on the next event
+            logger.warning(f"Session lookup failed, returning visitors may be missed: {e}")
+            return
+        found = {doc["session_id"]: doc.get("pageviews", 0) for doc in docs}
+        for session_id in missing:
+            # Pageviews observed here (possibly by a concurrent request) may
+            # not be flushed yet; keep the larger count
+            local = self.pageviews.get(session_id, (0, now))[0]
+            self.remember(session_id, max(local, found.get(session_id, 0)), now)
+
+    def observe(self, session_id: str, event_type: str) -> bool:
+        """Record an event and return True if the session already had a pageview"""
+        seen, loaded_at = self.pageviews.get(session_id, (0, time.monotonic()))
+        self.remember(session_id, seen + 1 if event_type == "pageview" else seen, loaded_at)
+        return seen > 0
+
+    def clear(self) -> None:
+        self.pageviews.clear()
+
+
+session_index = AnalyticsSessionIndex(ANALYTICS_SESSION_CACHE_SIZE, ANALYTICS_SESSION_CACHE_TTL_SECONDS)
+
+
+background_tasks: set = set()
+
+def spawn_background_task(coro) -> asyncio.Task:
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+ANALYTICS_BACKFILL_BATCH_SIZE = 1000
+
+async def backfill_analytics_timestamps(batch_size: int = ANALYTICS_BACKFILL_BATCH_SIZE, pause: float = 0.05) -> int:
+    """
+    Convert events whose timestamp is still an ISO string into native BSON
+    datetimes. Walks the collection in _id order in small batches so it can
+    run online next to live traffic; unparseable values are left untouched.
+    """
+    converted = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await db.analytics_events.find(query, {"_id": 1, "timestamp": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        operations = []
+        for doc in docs:
+            try:
+                timestamp = as_utc(doc["timestamp"])
+            except ValueError:
+                logger.warning(f"Skipping analytics event {doc['_id']} with unparseable timestamp {doc['timestamp']!r}")
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"], "timestamp": doc["timestamp"]}, {"$set": {"timestamp": timestamp}}))
+        if operations:
+            result = await db.analytics_events.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        await asyncio.sleep(pause)
+
+    if converted:
+        logger.info(f"Converted {converted} analytics event timestamps to BSON dates")
+    return converted
+
+
+# ==================== ANALYTICS WRITE-BEHIND BUFFER ====================
+
+ANALYTICS_BUFFER_MAX_EVENTS = int(os.environ.get('ANALYTICS_BUFFER_MAX_EVENTS', '10000'))
+ANALYTICS_FLUSH_BATCH_SIZE = int(os.environ.get('ANALYTICS_FLUSH_BATCH_SIZE', '500'))
+ANALYTICS_FLUSH_INTERVAL_MS = int(os.environ.get('ANALYTICS_FLUSH_INTERVAL_MS', '1000'))
+
+
+class AnalyticsWriteBuffer:
+    """
+    Bounded in-process queue between the tracking endpoint and MongoDB.
+    Events are acknowledged as soon as they are queued and written in
+    batches of `batch_size` or every `flush_interval_ms`, whichever comes
+    first. When the queue is full new events are dropped and counted.
+    """
 
-# ==================== EVOLUTION LEVELS API ====================
+    def __init__(self, max_events: int, batch_size: int, flush_interval_ms: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_events)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.flushes = 0
+        self.slowest_write_ms = 0.0  # since the sampler last looked
+
+    def submit(self, doc: Dict[str, Any]) -> bool:
+        if self.closed:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def start(self) -> None:
+        if self.task is None:
+            self.closed = False
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop accepting events and wait until everything queued is written"""
+        if self.task is None:
+            return
+        self.closed = True
+        await self.queue.put(None)  # wakes the flusher
+        await self.task
+        self.task = None
+
+    async def next_batch(self) -> tuple:
+        """Collect up to batch_size events, waiting at most flush_interval after the first"""
+        loop = asyncio.get_running_loop()
+        first = await self.queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                doc = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    doc = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if doc is None:
+                return batch, True
+            batch.append(doc)
+        return batch, False
+
+    async def run(self) -> None:
+        while True:
+            batch, stopping = await self.next_batch()
+            if batch:
+                await self.write(batch)
+            if stopping:
+                return
+
+    async def write(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            failed_positions = await persist_analytics_events(db, batch)
+        except Exception as e:
+            logger.error(f"Analytics buffer flush of {len(batch)} events failed: {e}")
+            self.failed += len(batch)
+            return
+        finally:
+            self.slowest_write_ms = max(self.slowest_write_ms, (time.perf_counter() - started) * 1000)
+        if failed_positions:
+            logger.warning(f"Analytics buffer flush: {len(failed_positions)} of {len(batch)} events rejected")
+        self.failed += len(failed_positions)
+        self.flushed += len(batch) - len(failed_positions)
+        self.flushes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "running": self.task is not None,
+        }
 
-class EvolutionLevel(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid4()))
-    rank_ru: str
-    rank_en: str
-    fomo_score_min: int
-    fomo_score_max: int
-    next_level_ru: str
-    next_level_en: str
-    description_ru: str
-    description_en: str
-    animation_type: str = "stellar"
-    animation_speed: str = "normal"  # slow, normal, fast
-    animation_intensity: str = "normal"  # subtle, normal, intense
-    gradient_from: str = "#64748b"
-    gradient_to: str = "#475569"
-    order: int = 0
-    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
-class EvolutionLevelCreate(BaseModel):
-    rank_ru: str
-    rank_en: str
-    fomo_score_min: int
-    fomo_score_max: int
-    next_level_ru: str
-    next_level_en: str
-    description_ru: str
-    description_en: str
-    animation_type: str = "stellar"
+analytics_buffer = AnalyticsWriteBuffer(
+    max_events=ANALYTICS_BUFFER_MAX_EVENTS,
+    batch_size=ANALYTICS_FLUSH_BATCH_SIZE,
+    flush_interval_ms=ANALYTICS_FLUSH_INTERVAL_MS
+)
+
+
+# ==================== REALTIME VISITORS ====================
+
+REALTIME_WINDOW_SECONDS = 1800
+REALTIME_ACTIVE_WINDOWS = {"1m": 60, "5m": 300, "30m": 1800}
+REALTIME_TOP_PAGES_SECONDS = 300
+# on: workers share the window through analytics_realtime (one query per
+# snapshot, one bulk upsert per worker every REALTIME_SLOT_SECONDS);
+# off: each worker reports the traffic it handled itself, from memory only
+REALTIME_SHARED = os.environ.get('REALTIME_SHARED', 'off') == 'on'
+# Length of a slot in the shared window; each worker flushes once per slot
+REALTIME_SLOT_SECONDS = int(os.environ.get('REALTIME_SLOT_SECONDS', '10'))
+
+
+class RealtimeWindow:
+    """
+    Sessions and pageviews of the last `seconds` in `slot_seconds` slots.
+
+    By default the window is per worker: recording and snapshots stay in
+    memory and never touch the database, so with several workers each one
+    reports only the traffic it handled. With shared=True every worker folds
+    its slots into analytics_realtime once per slot (one document per slot,
+    {_id: slot start epoch, at, sessions: [...], pages: {url: count}},
+    expired by a TTL index on `at`) and a snapshot reads the window's slots
+    from there plus what is not flushed yet.
+    """
+
+    def __init__(self, seconds: int, slot_seconds: int, shared: bool = False):
+        self.seconds = seconds
+        self.slot_seconds = slot_seconds
+        self.shared = shared
+        # The whole window, or (shared) the slots not flushed yet
+        self.slots: Dict[int, Dict[str, Any]] = {}
+
+    def slot(self, now: float) -> int:
+        return int(now) // self.slot_seconds * self.slot_seconds
+
+    def record(self, session_id: str, event_type: str, page_url: Optional[str]) -> None:
+        slot = self.slot(time.time())
+        entry = self.slots.get(slot)
+        if entry is None:
+            entry = self.slots[slot] = {"sessions": set(), "pages": Counter()}
+            if not self.shared:
+                # Slots are only dropped when a new one starts
+                for expired in [old for old in self.slots if old <= slot - self.seconds]:
+                    del self.slots[expired]
+        entry["sessions"].add(session_id)
+        if event_type == "pageview" and page_url:
+            entry["pages"][page_url] += 1
+
+    async def flush(self) -> None:
+        if not self.shared or not self.slots:
+            return
+        pending, self.slots = self.slots, {}
+        operations = []
+        for slot, entry in pending.items():
+            update: Dict[str, Any] = {
+                "$setOnInsert": {"at": datetime.fromtimestamp(slot, timezone.utc)},
+                "$addToSet": {"sessions": {"$each": list(entry["sessions"])}},
+            }
+            if entry["pages"]:
+                update["$inc"] = {f"pages.{encode_rollup_key(page)}": count for page, count in entry["pages"].items()}
+            operations.append(UpdateOne({"_id": slot}, update, upsert=True))
+        try:
+            await db.analytics_realtime.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Realtime window flush failed, retrying later: {e}")
+            horizon = self.slot(time.time()) - self.seconds
+            for slot, entry in pending.items():
+                if slot <= horizon:
+                    continue
+                current = self.slots.setdefault(slot, {"sessions": set(), "pages": Counter()})
+                current["sessions"] |= entry["sessions"]
+                current["pages"].update(entry["pages"])
+
+    async def snapshot(self, limit: int = 10) -> Dict[str, Any]:
+        now = time.time()
+        slots: Dict[int, tuple] = {}
+        if self.shared:
+            async for doc in db.analytics_realtime.find({"_id": {"$gt": now - self.seconds - self.slot_seconds}}):
+                pages = Counter({decode_rollup_key(page): count for page, count in (doc.get("pages") or {}).items()})
+                slots[doc["_id"]] = (set(doc.get("sessions") or []), pages)
+        for slot, entry in self.slots.items():
+            sessions, pages = slots.setdefault(slot, (set(), Counter()))
+            sessions |= entry["sessions"]
+            pages.update(entry["pages"])
+
+        # A slot counts toward a window when any part of it lies inside
+        def overlapping(length: int):
+            return [value for slot, value in slots.items() if slot + self.slot_seconds > now - length]
+
+        active = {
+            name: len(set().union(*(sessions for sessions, _ in overlapping(length))))
+            for name, length in REALTIME_ACTIVE_WINDOWS.items()
+        }
+        pages: Counter = Counter()
+        for _, slot_pages in overlapping(REALTIME_TOP_PAGES_SECONDS):
+            pages.update(slot_pages)
+        return {
+            "active_sessions": active,
+            "pageviews_last_5m": sum(pages.values()),
+            "top_pages": top_counts(pages, label="page", limit=limit, exclude=()),
+        }
+
+
+# Per worker, one-second slots keep the windows exact
+realtime_visitors = RealtimeWindow(REALTIME_WINDOW_SECONDS, REALTIME_SLOT_SECONDS if REALTIME_SHARED else 1, REALTIME_SHARED)
+
+
+async def run_realtime_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(REALTIME_SLOT_SECONDS)
+        await realtime_visitors.flush()
+
+
+# ==================== ANALYTICS SAMPLING ====================
+
+# off: keep every event; fixed: keep ANALYTICS_SAMPLE_RATE of the sessions;
+# adaptive: start at ANALYTICS_SAMPLE_RATE, halve the rate (down to
+# ANALYTICS_SAMPLE_MIN_RATE) while the write buffer is more than half full or
+# a flush took longer than ANALYTICS_SAMPLE_MAX_FLUSH_MS, and double it again
+# once the buffer has drained
+ANALYTICS_SAMPLING_MODE = os.environ.get('ANALYTICS_SAMPLING_MODE', 'off')
+ANALYTICS_SAMPLE_RATE = float(os.environ.get('ANALYTICS_SAMPLE_RATE', '1.0'))
+ANALYTICS_SAMPLE_MIN_RATE = float(os.environ.get('ANALYTICS_SAMPLE_MIN_RATE', '0.01'))
+ANALYTICS_SAMPLE_MAX_FLUSH_MS = int(os.environ.get('ANALYTICS_SAMPLE_MAX_FLUSH_MS', '500'))
+ANALYTICS_SAMPLE_HIGH_WATERMARK = 0.5
+ANALYTICS_SAMPLE_LOW_WATERMARK = 0.1
+ANALYTICS_SAMPLE_ADJUST_SECONDS = 1.0
+
+
+def session_sample_point(session_id: str) -> float:
+    """
+    Stable point in [0, 1) for a session; the session is kept while its
+    point is below the sampling rate. Salted so it is independent of the
+    HyperLogLog hash, which would otherwise only see a slice of registers.
+    """
+    digest = hashlib.blake2b(session_id.encode("utf-8"), digest_size=8, person=b"sampling").digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+class AnalyticsSampler:
+    """
+    Session-level sampling in front of the write buffer. Kept events carry
+    sample_weight = 1 / rate so aggregates can be scaled back up. Sessions
+    kept at a lower rate are a subset of those kept at a higher one, so a
+    rate change only affects sessions whose point lies between the two rates.
+    """
+
+    def __init__(self, mode: str, rate: float, min_rate: float):
+        self.mode = mode if mode in ("fixed", "adaptive") else "off"
+        self.min_rate = min(max(min_rate, 0.0001), 1.0)
+        self.max_rate = min(max(rate, self.min_rate), 1.0)
+        self.rate = 1.0 if self.mode == "off" else self.max_rate
+        self.adjusted_at = 0.0
+        self.adjustments = 0
+        self.kept = 0
+        self.sampled_out = 0
+
+    def adjust(self) -> None:
+        now = time.monotonic()
+        if self.mode != "adaptive" or now - self.adjusted_at < ANALYTICS_SAMPLE_ADJUST_SECONDS:
+            return
+        self.adjusted_at = now
+
+        fill = analytics_buffer.queue.qsize() / analytics_buffer.queue.maxsize
+        slow = analytics_buffer.slowest_write_ms > ANALYTICS_SAMPLE_MAX_FLUSH_MS
+        analytics_buffer.slowest_write_ms = 0.0
+        if fill > ANALYTICS_SAMPLE_HIGH_WATERMARK or slow:
+            rate = max(self.rate / 2, self.min_rate)
+        elif fill < ANALYTICS_SAMPLE_LOW_WATERMARK:
+            rate = min(self.rate * 2, self.max_rate)
+        else:
+            return
+        if rate != self.rate:
+            logger.info(f"Analytics sampling rate {self.rate:g} -> {rate:g} (buffer {fill:.0%} full, slow flush: {slow})")
+            self.rate = rate
+            self.adjustments += 1
+
+    def sample(self, session_id: str) -> Optional[float]:
+        """Weight to store on the event, or None when its session is sampled out"""
+        self.adjust()
+        if self.rate >= 1.0 or session_sample_point(session_id) < self.rate:
+            self.kept += 1
+            return 1 / self.rate
+        self.sampled_out += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "rate": self.rate,
+            "min_rate": self.min_rate,
+            "max_rate": self.max_rate,
+            "kept": self.kept,
+            "sampled_out": self.sampled_out,
+            "adjustments": self.adjustments,
+        }
+
+
+analytics_sampler = AnalyticsSampler(ANALYTICS_SAMPLING_MODE, ANALYTICS_SAMPLE_RATE, ANALYTICS_SAMPLE_MIN_RATE)
+
+
+# ==================== ANALYTICS BOT FILTERING ====================
+
+# on: crawler and automation traffic is tallied per day in
+# analytics_bot_counters and never stored as events; off: stored like visits
+ANALYTICS_BOT_FILTERING = os.environ.get('ANALYTICS_BOT_FILTERING', 'on')
+ANALYTICS_BOT_FLUSH_SECONDS = int(os.environ.get('ANALYTICS_BOT_FLUSH_SECONDS', '10'))
+
+
+class AnalyticsBotTally:
+    """
+    Bot hits per day and agent, counted in memory and folded into one
+    analytics_bot_counters document per day ({_id: "YYYY-MM-DD", total,
+    agents: {name: count}}) with a single $inc upsert per day on flush.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, Counter] = defaultdict(Counter)
+        self.filtered = 0
+        self.flushes = 0
+
+    def record(self, agent: str) -> None:
+        self.pending[datetime.now(timezone.utc).strftime("%Y-%m-%d")][agent] += 1
+        self.filtered += 1
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, defaultdict(Counter)
+        operations = [
+            UpdateOne(
+                {"_id": day},
+                {"$inc": {"total": sum(agents.values()), **{f"agents.{encode_rollup_key(agent)}": count for agent, count in agents.items()}}},
+                upsert=True
+            )
+            for day, agents in pending.items()
+        ]
+        try:
+            await db.analytics_bot_counters.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Bot counter flush failed, retrying later: {e}")
+            for day, agents in pending.items():
+                self.pending[day].update(agents)
+            return
+        self.flushes += 1
+
+
+analytics_bot_tally = AnalyticsBotTally()
+
+
+def filter_bot_event(event_data: AnalyticsEventCreate, request: Request) -> bool:
+    """True, after tallying it, when the event comes from a crawler or automation client"""
+    if ANALYTICS_BOT_FILTERING != "on":
+        return False
+    bot = detect_bot(event_data.user_agent or request.headers.get("user-agent", ""))
+    if bot is None:
+        return False
+    analytics_bot_tally.record(bot)
+    return True
+
+
+async def run_bot_tally_loop() -> None:
+    while True:
+        await asyncio.sleep(ANALYTICS_BOT_FLUSH_SECONDS)
+        await analytics_bot_tally.flush()
+
+
+# ==================== ANALYTICS RETENTION ====================
+
+# Raw events older than this many days are folded into their day rollup
+# bucket and deleted; 0 keeps raw events forever. Hour buckets follow the
+# same horizon, day buckets are kept indefinitely.
+ANALYTICS_RAW_RETENTION_DAYS = int(os.environ.get('ANALYTICS_RAW_RETENTION_DAYS', '0'))
+ANALYTICS_RETENTION_INTERVAL_MINUTES = int(os.environ.get('ANALYTICS_RETENTION_INTERVAL_MINUTES', '360'))
+ANALYTICS_DELETE_CHUNK_SIZE = int(os.environ.get('ANALYTICS_DELETE_CHUNK_SIZE', '1000'))
+
+ROLLUP_SOURCE_FIELDS = {
+    "_id": 0, "timestamp": 1, "session_id": 1, "session_duration": 1, "is_new_visitor": 1, "is_returning": 1, "sample_weight": 1,
+    **{dimension: 1 for dimension in ROLLUP_DIMENSIONS}
+}
+
+
+async def stage_rollups(query: Dict[str, Any], granularities: tuple = ROLLUP_GRANULARITIES) -> tuple:
+    """
+    Roll the raw events matching `query` up into a fresh staging collection,
+    away from the buckets live flushes write to. Returns (collection, events
+    processed); the caller drops the collection.
+    """
+    staging = db[f"analytics_rollups_staging_{uuid4().hex[:12]}"]
+    rollups = AnalyticsRollupBatch(staging, granularities)
+    processed = 0
+    async for event in db.analytics_events.find(query, ROLLUP_SOURCE_FIELDS).batch_size(1000):
+        rollups.add(event)
+        processed += 1
+        if processed % 5000 == 0:
+            await rollups.flush()
+    await rollups.flush()
+    return staging, processed
+
+
+async def swap_in_rollup_bucket(bucket: Dict[str, Any]) -> bool:
+    """
+    Replace a live bucket with a recomputed one in a single write. Compacted
+    buckets are the only record of their day once raw events expire and are
+    never replaced; returns False for those.
+    """
+    try:
+        await db.analytics_rollups.replace_one({"_id": bucket["_id"], "compacted": {"$ne": True}}, bucket, upsert=True)
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def delete_in_chunks(collection, query: Dict[str, Any], chunk_size: int = ANALYTICS_DELETE_CHUNK_SIZE, pause: float = 0.05) -> int:
+    """Delete matching documents in _id-ordered chunks so no single operation holds the collection for long"""
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in await collection.find(query, {"_id": 1}).sort("_id", 1).limit(chunk_size).to_list(chunk_size)]
+        if not ids:
+            return deleted
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        deleted += result.deleted_count
+        await asyncio.sleep(pause)
+
+
+async def downsample_analytics_day(day_start: datetime) -> Optional[int]:
+    """
+    Recompute the day rollup bucket from the raw events of that day and mark
+    it compacted, so the raw events can be deleted without losing history.
+
+    The bucket is built in a staging collection and swapped in with one
+    replace that only succeeds while the live bucket is not compacted yet.
+    When the retention loops of several workers race on the same day, the
+    first swap wins and the others, which may have read the day while its
+    raw events were being deleted, are discarded. Returns the number of
+    events folded in, or None when another run compacted the day first.
+    """
+    bucket_id = rollup_bucket_id(day_start, "day")
+    staging, processed = await stage_rollups(
+        {"timestamp": {"$gte": day_start, "$lt": day_start + timedelta(days=1)}},
+        granularities=("day",)
+    )
+    try:
+        bucket = await staging.find_one({"_id": bucket_id}) or {
+            "_id": bucket_id, "granularity": "day", "bucket": day_start, "updated_at": datetime.now(timezone.utc)
+        }
+    finally:
+        await staging.drop()
+    bucket["compacted"] = True
+    if not await swap_in_rollup_bucket(bucket):
+        return None
+    return processed
+
+
+async def apply_analytics_retention(retention_days: int = ANALYTICS_RAW_RETENTION_DAYS) -> Dict[str, Any]:
+    """Downsample and delete raw analytics older than the retention horizon, oldest day first"""
+    if retention_days <= 0:
+        return {"enabled": False}
+
+    cutoff = rollup_bucket_start(datetime.now(timezone.utc) - timedelta(days=retention_days), "day")
+    report = {"enabled": True, "cutoff": cutoff.isoformat(), "days_compacted": 0, "events_deleted": 0}
+
+    while True:
+        oldest = await db.analytics_events.find_one(
+            {"timestamp": {"$lt": cutoff}}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", 1)]
+        )
+        if not oldest:
+            break
+        day_start = rollup_bucket_start(as_utc(oldest["timestamp"]), "day")
+
+        # A compacted bucket means an earlier run already folded this day in
+        # and was interrupted while deleting; recomputing now would lose data
+        bucket = await db.analytics_rollups.find_one({"_id": rollup_bucket_id(day_start, "day")}, {"compacted": 1})
+        if not (bucket and bucket.get("compacted")):
+            if await downsample_analytics_day(day_start) is not None:
+                report["days_compacted"] += 1
+
+        report["events_deleted"] += await delete_in_chunks(
+            db.analytics_events,
+            {"timestamp": {"$gte": day_start, "$lt": day_start + timedelta(days=1)}}
+        )
+
+    await db.analytics_rollups.delete_many({"granularity": "hour", "bucket": {"$lt": cutoff}})
+    await db.analytics_sessions.delete_many({"last_seen": {"$lt": cutoff}})
+
+    if report["events_deleted"]:
+        logger.info(f"Analytics retention: compacted {report['days_compacted']} days, deleted {report['events_deleted']} raw events")
+    return report
+
+
+async def run_analytics_retention_loop():
+    while True:
+        try:
+            # Archive before compacting so raw events reach Parquet first
+            await archive_closed_analytics_months()
+            await apply_analytics_retention()
+        except Exception as e:
+            logger.error(f"Analytics retention run failed: {e}")
+        await asyncio.sleep(ANALYTICS_RETENTION_INTERVAL_MINUTES * 60)
+
+
+# ==================== ANALYTICS ARCHIVE ====================
+
+# Closed months of raw events can move out of MongoDB into one Parquet file
+# per month (hive-style year=/month= directories). Rollups stay in MongoDB;
+# readers of raw events merge the archived partitions back in.
+ANALYTICS_ARCHIVE_DIR = Path(os.environ.get('ANALYTICS_ARCHIVE_DIR', str(ROOT_DIR / "analytics_archive")))
+# Months at least this many months before the current one are archived
+# (1 = every closed month); 0 disables archiving
+ANALYTICS_ARCHIVE_AFTER_MONTHS = int(os.environ.get('ANALYTICS_ARCHIVE_AFTER_MONTHS', '0'))
+ANALYTICS_ARCHIVE_BATCH_SIZE = 5000
+
+# Archived columns: every AnalyticsEvent field, strings unless listed here
+ANALYTICS_ARCHIVE_FIELDS = list(AnalyticsEvent.model_fields)
+ANALYTICS_ARCHIVE_TYPES = {
+    "timestamp": "timestamp",
+    "session_duration": "int64",
+    "is_new_visitor": "bool",
+    "is_returning": "bool",
+    "conversion_value": "float64",
+    "sample_weight": "float64",
+}
+
+
+def archive_schema():
+    import pyarrow as pa
+
+    def column_type(field: str):
+        kind = ANALYTICS_ARCHIVE_TYPES.get(field, "string")
+        return pa.timestamp("ms", tz="UTC") if kind == "timestamp" else pa.type_for_alias(kind)
+
+    return pa.schema([(field, column_type(field)) for field in ANALYTICS_ARCHIVE_FIELDS])
+
+
+def month_start(timestamp: datetime) -> datetime:
+    return rollup_bucket_start(as_utc(timestamp), "day").replace(day=1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def archive_partition_path(month: datetime) -> Path:
+    return ANALYTICS_ARCHIVE_DIR / f"year={month.year}" / f"month={month.month:02d}" / "events.parquet"
+
+
+def archive_partition_month(path: Path) -> datetime:
+    """Inverse of archive_partition_path"""
+    return datetime(int(path.parent.parent.name[len("year="):]), int(path.parent.name[len("month="):]), 1, tzinfo=timezone.utc)
+
+
+def archived_partitions(start: datetime, end: datetime) -> List[Path]:
+    """Partition files of the months overlapping [start, end]"""
+    if not ANALYTICS_ARCHIVE_DIR.exists():
+        return []
+    paths = []
+    month = month_start(start)
+    while month <= end:
+        path = archive_partition_path(month)
+        if path.exists():
+            paths.append(path)
+        month = add_months(month, 1)
+    return paths
+
+
+def read_analytics_archive(
+    start: datetime,
+    end: datetime,
+    columns: List[str],
+    filters: Optional[Dict[str, Any]] = None
+) -> pd.DataFrame:
+    """
+    Archived events with start <= timestamp <= end, reading only `columns`.
+    Filters are pushed down to the Parquet row groups. Blocking; call it
+    through asyncio.to_thread.
+    """
+    paths = archived_partitions(start, end)
+    if not paths:
+        return pd.DataFrame(columns=columns)
+
+    import pyarrow.dataset as ds
+
+    expression = (ds.field("timestamp") >= start) & (ds.field("timestamp") <= end)
+    for field, value in (filters or {}).items():
+        expression = expression & (ds.field(field) == value)
+    dataset = ds.dataset([str(path) for path in paths], schema=archive_schema(), format="parquet")
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def open_archive_writer(tmp_path: Path, path: Path):
+    """
+    Open the Parquet writer of a partition and copy in the partition left by
+    a run interrupted while deleting. Returns the writer and the event ids
+    already archived. Blocking; call it through asyncio.to_thread.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    schema = archive_schema()
+    archived_ids: set = set()
+    writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+    try:
+        if path.exists():
+            for batch in ds.dataset(str(path), schema=schema, format="parquet").to_batches():
+                archived_ids.update(batch.column("id").to_pylist())
+                writer.write_batch(batch)
+    except BaseException:
+        writer.close()
+        raise
+    return writer, archived_ids
+
+
+def write_archive_rows(writer, rows: List[Dict[str, Any]]) -> None:
+    """Encode a batch of events and append it to the partition. Blocking"""
+    import pyarrow as pa
+
+    writer.write_table(pa.Table.from_pylist(rows, schema=writer.schema))
+
+
+async def archive_analytics_month(month: datetime) -> int:
+    """
+    Write one closed month of raw events to its Parquet partition, then
+    delete them from analytics_events. Returns the number of archived events.
+    Encoding and file I/O run in worker threads.
+    """
+    query = {"timestamp": {"$gte": month, "$lt": add_months(month, 1)}}
+    path = archive_partition_path(month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    archived = 0
+    writer, archived_ids = await asyncio.to_thread(open_archive_writer, tmp_path, path)
+    try:
+        rows = []
+        cursor = db.analytics_events.find(query, {"_id": 0}).sort("timestamp", 1).batch_size(ANALYTICS_ARCHIVE_BATCH_SIZE)
+        async for event in cursor:
+            if event.get("id") in archived_ids:
+                continue
+            event["timestamp"] = as_utc(event.get("timestamp"))
+            rows.append(event)
+            if len(rows) >= ANALYTICS_ARCHIVE_BATCH_SIZE:
+                await asyncio.to_thread(write_archive_rows, writer, rows)
+                archived += len(rows)
+                rows = []
+        if rows:
+            await asyncio.to_thread(write_archive_rows, writer, rows)
+            archived += len(rows)
+        await asyncio.to_thread(writer.close)
+    except BaseException:
+        writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if archived:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink(missing_ok=True)
+
+    # The month's rollups are now the only copy in MongoDB; compacted keeps
+    # /analytics/rollups/rebuild from wiping them
+    await db.analytics_rollups.update_many(
+        {"bucket": {"$gte": month, "$lt": add_months(month, 1)}},
+        {"$set": {"compacted": True}}
+    )
+    await delete_in_chunks(db.analytics_events, query)
+    return archived
+
+
+async def archive_closed_analytics_months(after_months: int = ANALYTICS_ARCHIVE_AFTER_MONTHS) -> Dict[str, Any]:
+    """Archive every month older than the archive horizon, oldest first"""
+    if after_months <= 0:
+        return {"enabled": False}
+
+    horizon = add_months(month_start(datetime.now(timezone.utc)), 1 - after_months)
+    report = {"enabled": True, "horizon": horizon.isoformat(), "months": [], "events_archived": 0}
+
+    while True:
+        oldest = await db.analytics_events.find_one(
+            {"timestamp": {"$lt": horizon}}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", 1)]
+        )
+        if not oldest:
+            break
+        month = month_start(oldest["timestamp"])
+        report["events_archived"] += await archive_analytics_month(month)
+        report["months"].append(month.strftime("%Y-%m"))
+
+    if report["months"]:
+        logger.info(f"Analytics archive: moved {report['events_archived']} events of {', '.join(report['months'])} to Parquet")
+    return report
+
+
+# ==================== ANALYTICS PURGE JOBS ====================
+
+# Purges run as background jobs recorded in analytics_jobs. Events are
+# deleted in _id-ordered chunks with a checkpoint after each chunk, so a job
+# survives restarts and its pace can be changed while it runs.
+ANALYTICS_PURGE_CHUNK_SIZE = int(os.environ.get('ANALYTICS_PURGE_CHUNK_SIZE', '1000'))
+ANALYTICS_PURGE_THROTTLE_MS = int(os.environ.get('ANALYTICS_PURGE_THROTTLE_MS', '100'))
+ANALYTICS_PURGE_MAX_CHUNK_SIZE = 10000
+ANALYTICS_PURGE_MAX_THROTTLE_MS = 10000
+# A running job whose heartbeat is older than this is taken over by the next poll
+ANALYTICS_JOB_LEASE_SECONDS = 60
+ANALYTICS_JOB_HEARTBEAT_SECONDS = ANALYTICS_JOB_LEASE_SECONDS // 4
+ANALYTICS_JOB_POLL_SECONDS = 30
+# Identifies this process as the holder of the jobs it claims
+ANALYTICS_WORKER_ID = uuid4().hex
+
+
+class AnalyticsJobLeaseLost(Exception):
+    """Another worker took over a job after this one stopped heartbeating"""
+
+
+def purge_events_query(start: Optional[datetime], end: datetime) -> Dict[str, Any]:
+    """
+    Events with start <= timestamp <= end. Events still carrying an ISO
+    string timestamp (not yet converted by backfill_analytics_timestamps)
+    are matched by comparing strings in the same isoformat; BSON only
+    compares values of the same type, so each branch sees its own kind.
+    """
+    time_range: Dict[str, Any] = {"$lte": end}
+    string_range: Dict[str, Any] = {"$lte": end.isoformat()}
+    if start:
+        time_range["$gte"] = start
+        string_range["$gte"] = start.isoformat()
+    return {"$or": [{"timestamp": time_range}, {"timestamp": string_range}]}
+
+
+async def claim_analytics_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Mark a pending or abandoned job as running in this process; None if
+    another one holds it. worker_id and the incremented attempts together
+    fence the lease: every later update of the job is conditional on them.
+    """
+    now = datetime.now(timezone.utc)
+    return await db.analytics_jobs.find_one_and_update(
+        {"id": job_id, "$or": [
+            {"status": "pending"},
+            {"status": "running", "updated_at": {"$lt": now - timedelta(seconds=ANALYTICS_JOB_LEASE_SECONDS)}},
+        ]},
+        {
+            "$set": {"status": "running", "worker_id": ANALYTICS_WORKER_ID, "updated_at": now},
+            "$min": {"started_at": now},
+            "$inc": {"attempts": 1},
+        },
+        {"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def update_claimed_job(job: Dict[str, Any], update: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Apply `update` to a job and refresh its heartbeat, but only while this
+    worker still holds the lease it claimed. Raises AnalyticsJobLeaseLost
+    once another worker has taken the job over.
+    """
+    update = dict(update or {})
+    update["$set"] = {**update.get("$set", {}), "updated_at": datetime.now(timezone.utc)}
+    updated = await db.analytics_jobs.find_one_and_update(
+        {"id": job["id"], "worker_id": job["worker_id"], "attempts": job["attempts"]},
+        update,
+        {"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        raise AnalyticsJobLeaseLost(job["id"])
+    return updated
+
+
+async def with_job_heartbeat(job: Dict[str, Any], step):
+    """
+    Await a long single step (a count, the rollup repair) while heartbeating
+    the job every ANALYTICS_JOB_HEARTBEAT_SECONDS. The step is cancelled if
+    the lease is lost.
+    """
+    task = asyncio.ensure_future(step)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=ANALYTICS_JOB_HEARTBEAT_SECONDS)
+            if done:
+                return task.result()
+            await update_claimed_job(job)
+    finally:
+        task.cancel()
+
+
+ROLLUP_BUCKET_LENGTHS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+async def recompute_rollup_bucket(bucket_start: datetime, granularity: str) -> None:
+    """
+    Rebuild one closed bucket from the raw events left in it, through a
+    staging collection and the guarded swap. Compacted buckets have no raw
+    events to recompute from and are kept as they are.
+    """
+    bucket_id = rollup_bucket_id(bucket_start, granularity)
+    staging, _ = await stage_rollups(
+        {"timestamp": {"$gte": bucket_start, "$lt": bucket_start + ROLLUP_BUCKET_LENGTHS[granularity]}},
+        granularities=(granularity,)
+    )
+    try:
+        bucket = await staging.find_one({"_id": bucket_id})
+    finally:
+        await staging.drop()
+    if bucket:
+        await swap_in_rollup_bucket(bucket)
+    else:
+        await db.analytics_rollups.delete_one({"_id": bucket_id, "compacted": {"$ne": True}})
+
+
+async def repair_purged_rollups(start: Optional[datetime], end: datetime, since: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Bring the rollups in line with a purged range: buckets entirely inside
+    it are dropped and the partly purged edge buckets are recomputed from
+    the raw events left.
+
+    Only buckets closed to live flushes (before closed_rollup_cutoff) are
+    touched, since rewriting an open one would race with their $inc. Returns
+    the cutoff when part of the range was still open, for a later pass with
+    since=cutoff to finish, or None once the whole range is repaired.
+    """
+    cutoff = closed_rollup_cutoff()
+    for granularity in ROLLUP_GRANULARITIES:
+        length = ROLLUP_BUCKET_LENGTHS[granularity]
+        closed_before = rollup_bucket_start(cutoff, granularity)
+        # Buckets before `first` were repaired by an earlier pass
+        first = rollup_bucket_start(since, granularity) if since else None
+
+        inside: Dict[str, Any] = {"$lte": end - length, "$lt": closed_before}
+        if start or first:
+            inside["$gte"] = max(bound for bound in (start, first) if bound)
+        await db.analytics_rollups.delete_many({"granularity": granularity, "bucket": inside})
+
+        edges = {rollup_bucket_start(end, granularity)}
+        if start:
+            edges.add(rollup_bucket_start(start, granularity))
+        for bucket_start in sorted(edges):
+            if bucket_start < closed_before and not (first and bucket_start < first):
+                await recompute_rollup_bucket(bucket_start, granularity)
+
+    if any(rollup_bucket_start(end, granularity) >= rollup_bucket_start(cutoff, granularity) for granularity in ROLLUP_GRANULARITIES):
+        return cutoff
+    return None
+
+
+async def repair_open_purge_rollups() -> int:
+    """Finish the rollup repair of completed purges whose last buckets were still open"""
+    jobs = await db.analytics_jobs.find(
+        {"status": "completed", "rollups_open_from": {"$lt": closed_rollup_cutoff()}}, {"_id": 0}
+    ).to_list(None)
+    for job in jobs:
+        open_from = await repair_purged_rollups(
+            as_utc(job["from"]) if job.get("from") else None, as_utc(job["to"]), since=as_utc(job["rollups_open_from"])
+        )
+        await db.analytics_jobs.update_one(
+            {"id": job["id"], "rollups_open_from": job["rollups_open_from"]},
+            {"$set": {"rollups_open_from": open_from}}
+        )
+    return len(jobs)
+
+
+def purge_archived_events(start: Optional[datetime], end: datetime) -> Tuple[int, int]:
+    """
+    Remove archived events with start <= timestamp <= end: partitions whose
+    whole month lies inside the range are deleted, partly covered ones are
+    rewritten without the purged rows (through a .tmp file, so an
+    interrupted rewrite leaves the old partition in place). Returns the
+    partitions removed and the events deleted. Blocking; call it through
+    asyncio.to_thread.
+    """
+    if not ANALYTICS_ARCHIVE_DIR.exists():
+        return 0, 0
+
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    schema = archive_schema()
+    purged = ds.field("timestamp") <= end
+    if start:
+        purged = purged & (ds.field("timestamp") >= start)
+    kept_rows = ~purged | ds.field("timestamp").is_null()
+
+    removed = deleted = 0
+    for path in sorted(ANALYTICS_ARCHIVE_DIR.glob("year=*/month=*/events.parquet")):
+        month = archive_partition_month(path)
+        month_end = add_months(month, 1)
+        if month > end or (start and month_end <= start):
+            continue
+        rows = pq.ParquetFile(path).metadata.num_rows
+        if (start is None or month >= start) and month_end <= end:
+            path.unlink()
+            removed += 1
+            deleted += rows
+            continue
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        kept = 0
+        writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+        try:
+            for batch in ds.dataset(str(path), schema=schema, format="parquet").to_batches(filter=kept_rows):
+                writer.write_batch(batch)
+                kept += batch.num_rows
+            writer.close()
+        except BaseException:
+            writer.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        if kept == rows:
+            tmp_path.unlink()
+            continue
+        if kept:
+            os.replace(tmp_path, path)
+        else:
+            tmp_path.unlink()
+            path.unlink()
+            removed += 1
+        deleted += rows - kept
+    return removed, deleted
+
+
+async def run_analytics_purge(job: Dict[str, Any]) -> None:
+    """Delete a claimed purge job's events chunk by chunk, then tidy up the derived data"""
+    start = as_utc(job["from"]) if job.get("from") else None
+    end = as_utc(job["to"])
+    query = purge_events_query(start, end)
+    try:
+        if job.get("total") is None:
+            total = await with_job_heartbeat(job, db.analytics_events.count_documents(query))
+            job = await update_claimed_job(job, {"$set": {"total": total}})
+
+        last_id = job.get("last_id")
+        while True:
+            chunk_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+            chunk_size = job["chunk_size"]
+            ids = [doc["_id"] for doc in await db.analytics_events.find(chunk_query, {"_id": 1}).sort("_id", 1).limit(chunk_size).to_list(chunk_size)]
+            if not ids:
+                break
+            result = await db.analytics_events.delete_many({"_id": {"$in": ids}})
+            last_id = ids[-1]
+            job = await update_claimed_job(job, {"$set": {"last_id": last_id}, "$inc": {"deleted": result.deleted_count}})
+
+            # Back off harder while tracking writes are queueing up behind us
+            pause = job["throttle_ms"] / 1000
+            if analytics_buffer.queue.qsize() > analytics_buffer.queue.maxsize // 2:
+                pause = max(pause * 4, 0.5)
+            await asyncio.sleep(pause)
+
+        archived_months, archived_events = await with_job_heartbeat(job, asyncio.to_thread(purge_archived_events, start, end))
+        rollups_open_from = await with_job_heartbeat(job, repair_purged_rollups(start, end))
+        session_range: Dict[str, Any] = {"last_seen": {"$lte": end}}
+        if start:
+            session_range["first_seen"] = {"$gte": start}
+        await db.analytics_sessions.delete_many(session_range)
+        # Bot counters are per day: drop the days the range covers completely
+        bot_days: Dict[str, Any] = {"$lte": (end + timedelta(microseconds=1) - timedelta(days=1)).strftime("%Y-%m-%d")}
+        if start:
+            bot_days["$gte"] = ((start - timedelta(microseconds=1)).date() + timedelta(days=1)).isoformat()
+        await db.analytics_bot_counters.delete_many({"_id": bot_days})
+        session_index.clear()
+        analytics_columns.clear()
+
+        job = await update_claimed_job(job, {
+            "$set": {
+                "status": "completed", "archived_months_removed": archived_months, "archived_events_deleted": archived_events,
+                "rollups_open_from": rollups_open_from, "finished_at": datetime.now(timezone.utc),
+            },
+            "$inc": {"deleted": archived_events},
+        })
+        logger.info(f"Analytics purge {job['id']} completed, {job['deleted']} events deleted ({archived_events} archived)")
+    except AnalyticsJobLeaseLost:
+        logger.warning(f"Analytics purge {job['id']} was taken over by another worker; stopping here")
+    except Exception as e:
+        logger.error(f"Analytics purge {job['id']} failed: {e}")
+        try:
+            await update_claimed_job(job, {"$set": {"status": "failed", "error": str(e)}})
+        except AnalyticsJobLeaseLost:
+            pass
+
+
+async def resume_analytics_jobs() -> int:
+    """Claim pending jobs and jobs whose worker stopped heartbeating, and run them here"""
+    stale = datetime.now(timezone.utc) - timedelta(seconds=ANALYTICS_JOB_LEASE_SECONDS)
+    candidates = await db.analytics_jobs.find(
+        {"$or": [{"status": "pending"}, {"status": "running", "updated_at": {"$lt": stale}}]},
+        {"_id": 0, "id": 1}
+    ).to_list(None)
+    resumed = 0
+    for candidate in candidates:
+        job = await claim_analytics_job(candidate["id"])
+        if job:
+            spawn_background_task(run_analytics_purge(job))
+            resumed += 1
+    return resumed
+
+
+async def run_analytics_jobs_loop():
+    while True:
+        try:
+            await resume_analytics_jobs()
+            await repair_open_purge_rollups()
+        except Exception as e:
+            logger.error(f"Resuming analytics jobs failed: {e}")
+        await asyncio.sleep(ANALYTICS_JOB_POLL_SECONDS)
+
+
+def analytics_job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    status = {**job, "last_id": str(job["last_id"]) if job.get("last_id") else None}
+    total = job.get("total")
+    status["progress"] = round(min(job.get("deleted", 0) / total, 1.0) * 100, 2) if total else (100.0 if job["status"] == "completed" else 0.0)
+    return status
+
+
+# ==================== ANALYTICS COLUMN ENGINE ====================
+
+# A period's raw events loaded once as dictionary-encoded numpy columns
+# (integer code per event + distinct labels), so ad-hoc breakdowns are
+# vectorized unique/bincount passes over memory instead of Mongo scans
+ANALYTICS_COLUMN_FIELDS = (
+    "event_type", "device_type", "browser", "os", "traffic_source",
+    "source_detail", "country", "city", "page_url", "session_id",
+)
+ANALYTICS_COLUMN_CACHE_TTL_SECONDS = int(os.environ.get('ANALYTICS_COLUMN_CACHE_TTL_SECONDS', '60'))
+ANALYTICS_COLUMN_CACHE_SIZE = int(os.environ.get('ANALYTICS_COLUMN_CACHE_SIZE', '4'))
+ANALYTICS_COLUMN_LOAD_BATCH_SIZE = 5000
+# Longest period the analytics endpoints accept; raw-event endpoints load
+# the whole period into memory
+ANALYTICS_MAX_PERIOD_DAYS = int(os.environ.get('ANALYTICS_MAX_PERIOD_DAYS', '366'))
+INT64_MAX = np.iinfo(np.int64).max
+
+
+class AnalyticsColumns:
+    """Categorical event columns: codes[field][i] indexes labels[field]"""
+
+    def __init__(self, values: Dict[str, List[Any]], weights: List[float], loaded_at: datetime):
+        self.size = len(values["session_id"])
+        self.loaded_at = loaded_at
+        self.created = time.monotonic()
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, np.ndarray] = {}
+        for field in ANALYTICS_COLUMN_FIELDS:
+            codes, labels = pd.factorize(np.asarray(values[field], dtype=object))
+            self.codes[field] = codes.astype(np.int32)
+            self.labels[field] = np.asarray(labels, dtype=object)
+
+    def mask(self, filters: Dict[str, str]) -> Optional[np.ndarray]:
+        """Boolean row mask for field == value filters (None when unfiltered)"""
+        mask = None
+        for field, value in filters.items():
+            matches = np.flatnonzero(self.labels[field] == value)
+            selected = self.codes[field] == matches[0] if len(matches) else np.zeros(self.size, dtype=bool)
+            mask = selected if mask is None else mask & selected
+        return mask
+
+    def group_keys(self, fields: List[str]) -> np.ndarray:
+        """One int64 key per event identifying its combination of `fields`"""
+        shape = tuple(len(self.labels[field]) for field in fields)
+        if math.prod(shape) <= INT64_MAX:
+            return np.ravel_multi_index([self.codes[field] for field in fields], shape) if fields else np.zeros(self.size, dtype=np.int64)
+        # The combined key space overflows int64 (several high-cardinality
+        # fields): fold the fields in one at a time and renumber the
+        # combinations densely after each, which keeps keys below size²
+        keys = np.zeros(self.size, dtype=np.int64)
+        for field in fields:
+            keys = keys * len(self.labels[field]) + self.codes[field]
+            keys = np.unique(keys, return_inverse=True)[1].astype(np.int64).ravel()
+        return keys
+
+    def group(self, fields: List[str], mask: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Event counts and distinct sessions per combination of `fields`,
+        both scaled by sample weight. Returns the label arrays per field plus
+        "events" and "sessions", one entry per non-empty group.
+        """
+        keys = self.group_keys(fields)
+        session_codes = self.codes["session_id"]
+        weights = self.weights
+        if mask is not None:
+            keys = keys[mask]
+            session_codes = session_codes[mask]
+            weights = weights[mask]
+
+        groups, group_rows, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        events = np.bincount(inverse, weights=weights, minlength=len(groups))
+
+        # Distinct (group, session) pairs, counted back per group with the
+        # sample weight of the pair's first event
+        session_count = max(len(self.labels["session_id"]), 1)
+        pairs, first = np.unique(inverse.astype(np.int64) * session_count + session_codes, return_index=True)
+        sessions = np.bincount(pairs // session_count, weights=weights[first], minlength=len(groups))
+
+        result = {"events": events, "sessions": sessions}
+        for field in fields:
+            # Labels of each group, read off its first event
+            codes = self.codes[field] if mask is None else self.codes[field][mask]
+            result[field] = self.labels[field][codes[group_rows]]
+        return result
+
+
+async def load_analytics_columns(period: int) -> AnalyticsColumns:
+    """Stream the period's raw events into column lists and encode them"""
+    loaded_at = datetime.now(timezone.utc)
+    values: Dict[str, List[Any]] = {field: [] for field in ANALYTICS_COLUMN_FIELDS}
+    weights: List[float] = []
+    defaults = {field: ROLLUP_DIMENSIONS.get(field, "") for field in ANALYTICS_COLUMN_FIELDS}
+    cursor = db.analytics_events.find(
+        {"timestamp": {"$gte": loaded_at - timedelta(days=period)}},
+        {"_id": 0, "sample_weight": 1, **{field: 1 for field in ANALYTICS_COLUMN_FIELDS}},
+        batch_size=ANALYTICS_COLUMN_LOAD_BATCH_SIZE
+    )
+    async for doc in cursor:
+        for field in ANALYTICS_COLUMN_FIELDS:
+            values[field].append(doc.get(field) or defaults[field])
+        weights.append(doc.get("sample_weight") or 1.0)
+
+    archived = await asyncio.to_thread(
+        read_analytics_archive, loaded_at - timedelta(days=period), loaded_at, [*ANALYTICS_COLUMN_FIELDS, "sample_weight"]
+    )
+    if len(archived):
+        for field in ANALYTICS_COLUMN_FIELDS:
+            values[field].extend(archived[field].fillna(defaults[field]).replace("", defaults[field]).tolist())
+        weights.extend(archived["sample_weight"].fillna(1.0).tolist())
+    return AnalyticsColumns(values, weights, loaded_at)
+
+
+class AnalyticsColumnCache:
+    """
+    Column batches per period, reused for ANALYTICS_COLUMN_CACHE_TTL_SECONDS.
+    Concurrent requests for the same period share a single load.
+    """
+
+    def __init__(self, capacity: int, ttl: int):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.loading: Dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, period: int) -> AnalyticsColumns:
+        columns = self.entries.get(period)
+        if columns is not None and time.monotonic() - columns.created < self.ttl:
+            self.hits += 1
+            self.entries.move_to_end(period)
+            return columns
+
+        self.misses += 1
+        task = self.loading.get(period)
+        if task is None:
+            task = asyncio.create_task(load_analytics_columns(period))
+            self.loading[period] = task
+            task.add_done_callback(lambda _: self.loading.pop(period, None))
+        columns = await asyncio.shield(task)
+
+        self.entries[period] = columns
+        self.entries.move_to_end(period)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return columns
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+analytics_columns = AnalyticsColumnCache(ANALYTICS_COLUMN_CACHE_SIZE, ANALYTICS_COLUMN_CACHE_TTL_SECONDS)
+
+
+# ==================== ANALYTICS API ====================
+
+def enrich_analytics_event(event_data: AnalyticsEventCreate, request: Request) -> AnalyticsEvent:
+    """Build a stored event from client data plus user agent, referrer and IP info"""
+    # Parse user agent
+    user_agent_str = event_data.user_agent or request.headers.get("user-agent", "")
+    ua_info = parse_user_agent(user_agent_str)
+    
+    # Determine traffic source
+    traffic_info = determine_traffic_source(event_data.referrer)
+    
+    # Resolve location from the client IP with the local GeoIP table
+    ip_address = client_ip(request)
+    country, city = lookup_ip_location(ip_address)
+
+    return AnalyticsEvent(
+        **event_data.model_dump(exclude={"user_agent"}),
+        user_agent=user_agent_str,
+        device_type=ua_info["device_type"],
+        browser=ua_info["browser"],
+        os=ua_info["os"],
+        traffic_source=traffic_info["traffic_source"],
+        source_detail=traffic_info["source_detail"],
+        ip_address=ip_address,
+        country=country,
+        city=city
+    )
+
+
+@api_router.post("/analytics/track")
+async def track_analytics_event(event_data: AnalyticsEventCreate, request: Request):
+    """
+    Track an analytics event (pageview, click, conversion, etc.)
+    """
+    if filter_bot_event(event_data, request):
+        # Crawler: only counted in the daily bot tally
+        return {"success": True, "event_id": None, "bot": True}
+
+    # Live view sees every visitor, sampled out or not
+    realtime_visitors.record(event_data.session_id, event_data.event_type, event_data.page_url)
+    weight = analytics_sampler.sample(event_data.session_id)
+    if weight is None:
+        # Session sampled out: accepted, but nothing is stored
+        return {"success": True, "event_id": None, "sampled_out": True}
+
+    event = enrich_analytics_event(event_data, request)
+    event.sample_weight = weight
+    
+    # Check if returning visitor
+    await session_index.load([event.session_id])
+    if session_index.observe(event.session_id, event.event_type):
+        event.is_returning = True
+        event.is_new_visitor = False
+    
+    # Hand off to the write-behind buffer; persistence happens off the request path
+    doc = event.model_dump()
+    queued = analytics_buffer.submit(doc)
+    
+    return {"success": queued, "event_id": event.id}
+
+
+ANALYTICS_BATCH_MAX_EVENTS = 500
+
+@api_router.post("/analytics/track/batch")
+async def track_analytics_events_batch(events_data: List[dict], request: Request):
+    """
+    Track up to 500 analytics events in one request.
+    Events are validated and enriched individually and written with a single
+    unordered insert_many; the response lists an event_id, an error, bot or
+    sampled_out for every input position.
+    """
+    if len(events_data) > ANALYTICS_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {ANALYTICS_BATCH_MAX_EVENTS} events)")
+    
+    results: List[Dict[str, Any]] = [{"index": index} for index in range(len(events_data))]
+    events: List[tuple] = []
+    for index, raw_event in enumerate(events_data):
+        try:
+            event_data = AnalyticsEventCreate.model_validate(raw_event)
+        except ValidationError as e:
+            results[index]["error"] = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            continue
+        if filter_bot_event(event_data, request):
+            results[index]["bot"] = True
+            continue
+        realtime_visitors.record(event_data.session_id, event_data.event_type, event_data.page_url)
+        weight = analytics_sampler.sample(event_data.session_id)
+        if weight is None:
+            results[index]["sampled_out"] = True
+            continue
+        event = enrich_analytics_event(event_data, request)
+        event.sample_weight = weight
+        events.append((index, event))
+    
+    # Returning visitors: one session lookup for the whole batch, then
+    # pageviews earlier in the same batch count as well
+    await session_index.load([event.session_id for _, event in events])
+    
+    docs = []
+    for index, event in events:
+        if session_index.observe(event.session_id, event.event_type):
+            event.is_returning = True
+            event.is_new_visitor = False
+        docs.append(event.model_dump())
+    
+    failed_positions = await persist_analytics_events(db, docs)
+    for position, (index, event) in enumerate(events):
+        if position in failed_positions:
+            results[index]["error"] = failed_positions[position]
+        else:
+            results[index]["event_id"] = event.id
+    
+    accepted = sum(1 for result in results if "event_id" in result)
+    sampled_out = sum(1 for result in results if result.get("sampled_out"))
+    bots = sum(1 for result in results if result.get("bot"))
+    return {
+        "success": accepted + sampled_out + bots == len(results),
+        "accepted": accepted,
+        "sampled_out": sampled_out,
+        "bots": bots,
+        "rejected": len(results) - accepted - sampled_out - bots,
+        "results": results
+    }
+
+
+STATS_TOTALS = (
+    "events", "page_views", "button_clicks", "conversions",
+    "new_visitors", "returning_visitors", "duration_sum", "duration_count",
+)
+
+# Breakdown -> (event field, value used when the event does not carry one,
+# event_type counted or None for every event)
+STATS_BREAKDOWNS = {
+    "devices": ("device_type", "desktop", None),
+    "countries": ("country", "Unknown", None),
+    "cities": ("city", "Unknown", None),
+    "pages": ("page_url", "Unknown", "pageview"),
+    "traffic_sources": ("traffic_source", "direct", None),
+    "source_details": ("source_detail", "Direct", None),
+}
+
+
+def analytics_stats_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build a single-pass $facet pipeline producing every AnalyticsStats breakdown"""
+    # Every count is a sum of sample weights
+    weight = {"$ifNull": ["$sample_weight", 1]}
+
+    def count_if(condition):
+        return {"$sum": {"$cond": [condition, weight, 0]}}
+
+    is_pageview = {"$eq": ["$event_type", "pageview"]}
+    has_duration = {"$ne": [{"$ifNull": ["$session_duration", 0]}, 0]}
+
+    return [
+        {"$match": match},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "events": {"$sum": weight},
+                    "page_views": count_if(is_pageview),
+                    "button_clicks": count_if({"$eq": ["$event_type", "click"]}),
+                    "conversions": count_if({"$eq": ["$event_type", "conversion"]}),
+                    "new_visitors": count_if({"$and": [is_pageview, {"$eq": ["$is_new_visitor", True]}]}),
+                    "returning_visitors": count_if({"$and": [is_pageview, {"$eq": ["$is_returning", True]}]}),
+                    "duration_sum": {"$sum": {"$cond": [has_duration, {"$multiply": ["$session_duration", weight]}, 0]}},
+                    "duration_count": count_if(has_duration),
+                }},
+            ],
+            "sessions": [
+                {"$match": {"session_id": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$session_id", "weight": {"$max": weight}}},
+                {"$group": {"_id": None, "count": {"$sum": "$weight"}}},
+            ],
+            # Full value counts; the top-N cut happens after merging with the archive
+            **{
+                breakdown: [
+                    *([{"$match": {"event_type": event_type}}] if event_type else []),
+                    {"$group": {"_id": {"$ifNull": [f"${field}", default]}, "count": {"$sum": weight}}},
+                ]
+                for breakdown, (field, default, event_type) in STATS_BREAKDOWNS.items()
+            },
+        }},
+    ]
+
+
+def stats_facet_counts(facets: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten the $facet output into totals plus a value -> count map per breakdown"""
+    totals = (facets.get("totals") or [{}])[0]
+    sessions = facets.get("sessions") or []
+    counts: Dict[str, Any] = {key: totals.get(key, 0) for key in STATS_TOTALS}
+    counts["unique_sessions"] = sessions[0]["count"] if sessions else 0
+    for breakdown in STATS_BREAKDOWNS:
+        counts[breakdown] = Counter({row["_id"]: row["count"] for row in facets.get(breakdown, [])})
+    return counts
+
+
+ARCHIVE_STATS_COLUMNS = [
+    "timestamp", "sample_weight", "event_type", "session_id", "session_duration", "is_new_visitor", "is_returning",
+    *(field for field, _, _ in STATS_BREAKDOWNS.values()),
+]
+
+
+def archive_stats_counts(frame: pd.DataFrame) -> Dict[str, Any]:
+    """The stats_facet_counts shape, computed from archived events"""
+    weight = frame["sample_weight"].fillna(1.0)
+    is_pageview = frame["event_type"] == "pageview"
+    duration = frame["session_duration"].fillna(0)
+    has_duration = duration != 0
+    sessions = frame["session_id"].notna() & (frame["session_id"] != "")
+
+    counts: Dict[str, Any] = {
+        "events": float(weight.sum()),
+        "page_views": float(weight[is_pageview].sum()),
+        "button_clicks": float(weight[frame["event_type"] == "click"].sum()),
+        "conversions": float(weight[frame["event_type"] == "conversion"].sum()),
+        "new_visitors": float(weight[is_pageview & frame["is_new_visitor"].eq(True)].sum()),
+        "returning_visitors": float(weight[is_pageview & frame["is_returning"].eq(True)].sum()),
+        "duration_sum": float((duration * weight)[has_duration].sum()),
+        "duration_count": float(weight[has_duration].sum()),
+        "unique_sessions": float(weight[sessions].groupby(frame.loc[sessions, "session_id"]).max().sum()),
+    }
+    for breakdown, (field, default, event_type) in STATS_BREAKDOWNS.items():
+        selected = frame["event_type"] == event_type if event_type else slice(None)
+        values = frame.loc[selected, field].fillna(default)
+        counts[breakdown] = Counter({value: float(total) for value, total in weight[selected].groupby(values).sum().items()})
+    return counts
+
+
+def build_analytics_stats(
+    *,
+    page_views: int = 0,
+    button_clicks: int = 0,
+    conversions: int = 0,
+    new_visitors: int = 0,
+    returning_visitors: int = 0,
+    duration_sum: float = 0,
+    duration_count: int = 0,
+    unique_sessions: int = 0,
+    unique_sessions_error: float = 0.0,
+    devices: Dict[str, int],
+    countries: List[Dict[str, Any]],
+    cities: List[Dict[str, Any]],
+    pages: List[Dict[str, Any]] = (),
+    traffic_sources: Dict[str, int],
+    source_details: List[Dict[str, Any]],
+) -> AnalyticsStats:
+    """Derive rates and percentages from pre-aggregated analytics counters"""
+    # Counters are sums of sample weights; report whole numbers
+    page_views, button_clicks, conversions, new_visitors, returning_visitors, unique_sessions = (
+        int(round(value)) for value in (page_views, button_clicks, conversions, new_visitors, returning_visitors, unique_sessions)
+    )
+    devices = {key: int(round(value)) for key, value in devices.items()}
+    traffic_sources = {key: int(round(value)) for key, value in traffic_sources.items()}
+
+    stats = AnalyticsStats(
+        page_views=page_views,
+        button_clicks=button_clicks,
+        conversions=conversions,
+        unique_sessions=unique_sessions,
+        unique_sessions_error=unique_sessions_error,
+    )
+
+    # Conversion rate
+    if stats.unique_sessions > 0:
+        stats.conversion_rate = round((stats.conversions / stats.unique_sessions) * 100, 2)
+
+    # Average session duration
+    if duration_count:
+        stats.avg_session_duration = int(duration_sum / duration_count)
+
+    # Visitor types
+    total_visitors = new_visitors + returning_visitors
+    if total_visitors > 0:
+        stats.new_visitors = new_visitors
+        stats.returning_visitors = returning_visitors
+        stats.new_visitors_percent = round((new_visitors / total_visitors) * 100, 2)
+        stats.returning_visitors_percent = round((returning_visitors / total_visitors) * 100, 2)
+
+    # Device breakdown
+    total_device_events = sum(devices.values())
+    if total_device_events > 0:
+        stats.desktop_visitors = devices.get("desktop", 0)
+        stats.mobile_visitors = devices.get("mobile", 0)
+        stats.tablet_visitors = devices.get("tablet", 0)
+        stats.desktop_percent = round((stats.desktop_visitors / total_device_events) * 100, 2)
+        stats.mobile_percent = round((stats.mobile_visitors / total_device_events) * 100, 2)
+        stats.tablet_percent = round((stats.tablet_visitors / total_device_events) * 100, 2)
+
+    # Geography
+    stats.top_countries = countries
+    stats.top_cities = cities
+
+    # Content
+    stats.top_pages = list(pages)
+
+    # Traffic sources
+    total_traffic = sum(traffic_sources.values())
+    if total_traffic > 0:
+        stats.direct_traffic = traffic_sources.get("direct", 0)
+        stats.referral_traffic = traffic_sources.get("referral", 0)
+        stats.search_traffic = traffic_sources.get("search", 0)
+        stats.direct_percent = round((stats.direct_traffic / total_traffic) * 100, 2)
+        stats.referral_percent = round((stats.referral_traffic / total_traffic) * 100, 2)
+        stats.search_percent = round((stats.search_traffic / total_traffic) * 100, 2)
+
+        # Detailed sources
+        stats.detailed_sources = [
+            {"source": item["source"], "count": item["count"], "percent": round((item["count"] / total_traffic) * 100, 2)}
+            for item in source_details
+        ]
+
+    return stats
+
+
+async def archived_live_session_overlap(archived: pd.DataFrame, start_date: datetime, end_date: datetime) -> float:
+    """
+    Weighted count of sessions with events both in the archived frame and in
+    analytics_events.
+    Only sessions straddling a month boundary between start_date and the end
+    of the newest archived month qualify (late events can land live next to
+    any archived month), and analytics_sessions finds those without scanning
+    events.
+    """
+    boundaries = []
+    month = add_months(month_start(start_date), 1)
+    last = add_months(month_start(archived["timestamp"].max().to_pydatetime()), 1)
+    while month <= last:
+        boundaries.append(month)
+        month = add_months(month, 1)
+    straddling = await db.analytics_sessions.distinct(
+        "session_id",
+        {"$or": [{"first_seen": {"$lt": boundary}, "last_seen": {"$gte": boundary}} for boundary in boundaries]}
+    )
+    candidates = list(set(straddling) & set(archived["session_id"].dropna()))
+    if not candidates:
+        return 0
+    live = await db.analytics_events.distinct(
+        "session_id", {"timestamp": {"$gte": start_date, "$lte": end_date}, "session_id": {"$in": candidates}}
+    )
+    weights = archived["sample_weight"].fillna(1.0).groupby(archived["session_id"]).max()
+    return float(weights[weights.index.isin(live)].sum())
+
+
+async def raw_analytics_stats(start_date: datetime, end_date: datetime) -> AnalyticsStats:
+    """
+    Compute analytics statistics straight from raw events with a single
+    $facet aggregation, plus archived months read from Parquet. Slower than
+    the rollups; used for audits.
+    """
+    match = {"timestamp": {"$gte": start_date, "$lte": end_date}}
+    cursor = db.analytics_events.aggregate(analytics_stats_pipeline(match), allowDiskUse=True)
+    result = await cursor.to_list(1)
+    counts = stats_facet_counts(result[0] if result else {})
+
+    archived = await asyncio.to_thread(read_analytics_archive, start_date, end_date, ARCHIVE_STATS_COLUMNS)
+    if len(archived):
+        for key, value in archive_stats_counts(archived).items():
+            counts[key] += value
+        counts["unique_sessions"] -= await archived_live_session_overlap(archived, start_date, end_date)
+
+    if not counts["events"]:
+        return AnalyticsStats()
+
+    return build_analytics_stats(
+        page_views=counts["page_views"],
+        button_clicks=counts["button_clicks"],
+        conversions=counts["conversions"],
+        new_visitors=counts["new_visitors"],
+        returning_visitors=counts["returning_visitors"],
+        duration_sum=counts["duration_sum"],
+        duration_count=counts["duration_count"],
+        unique_sessions=counts["unique_sessions"],
+        devices=counts["devices"],
+        countries=top_counts(counts["countries"]),
+        cities=top_counts(counts["cities"]),
+        pages=top_counts(counts["pages"], label="page"),
+        traffic_sources=counts["traffic_sources"],
+        source_details=top_counts(counts["source_details"], label="source", exclude=()),
+    )
+
+
+@api_router.get("/analytics/stats")
+async def get_analytics_stats(period: int = Query(30, ge=1, le=ANALYTICS_MAX_PERIOD_DAYS), exact: bool = False):
+    """
+    Get analytics statistics for a given period (days)
+    period: 7, 30, or 90 days
+    exact: recompute from raw events instead of the rollup buckets
+
+    Counters come from the hour/day rollup buckets, so the cost depends on
+    the period length rather than on the number of stored events. Unique
+    sessions are a HyperLogLog estimate; unique_sessions_error is its
+    relative standard error (0 for exact=true).
+    """
+    # Calculate date range
+    end_date = datetime.now(timezone.utc)
+    start_date = end_date - timedelta(days=period)
+
+    if exact:
+        return await raw_analytics_stats(start_date, end_date)
+
+    buckets = await db.analytics_rollups.find(
+        rollup_range_query(start_date, end_date),
+        {"_id": 0, "updated_at": 0}
+    ).to_list(None)
+    buckets = drop_shadowed_day_buckets(buckets)
+    if not buckets:
+        return AnalyticsStats()
+    merged = merge_rollup_buckets(buckets)
+
+    event_types = merged["event_type"]
+    return build_analytics_stats(
+        page_views=event_types.get("pageview", 0),
+        button_clicks=event_types.get("click", 0),
+        conversions=event_types.get("conversion", 0),
+        new_visitors=merged["new_visitors"],
+        returning_visitors=merged["returning_visitors"],
+        duration_sum=merged["duration_sum"],
+        duration_count=merged["duration_count"],
+        # Distinct sampled sessions, scaled up by the average sample weight
+        unique_sessions=merged["sessions"].count() * (merged["events"] / merged["sampled_events"] if merged["sampled_events"] else 1),
+        unique_sessions_error=merged["sessions"].relative_error,
+        devices=merged["device_type"],
+        countries=top_counts(merged["country"].estimates()),
+        cities=top_counts(merged["city"].estimates()),
+        pages=top_counts(merged["page_url"].estimates(), label="page"),
+        traffic_sources=merged["traffic_source"],
+        source_details=top_counts(merged["source_detail"].estimates(), label="source", exclude=()),
+    )
+
+
+@api_router.post("/analytics/rollups/rebuild")
+async def rebuild_analytics_rollups(period: int = Query(90, ge=1, le=ANALYTICS_MAX_PERIOD_DAYS)):
+    """
+    Recompute rollup buckets from raw events for the last `period` days
+    (whole days). Use once after deploying rollups, or after manual edits
+    to analytics_events. Days already compacted by the retention job are
+    left as they are.
+
+    The buckets are built in a staging collection and swapped in one
+    document at a time, so readers never see a half-built range. Only closed
+    buckets are rebuilt: the current hour and day still receive live
+    flushes and are left to them.
+    """
+    start_date = rollup_bucket_start(datetime.now(timezone.utc) - timedelta(days=period), "day")
+    cutoff = closed_rollup_cutoff()
+    staging, processed = await stage_rollups({"timestamp": {"$gte": start_date, "$lt": cutoff}})
+    try:
+        rebuilt = []
+        async for bucket in staging.find(closed_rollup_buckets(cutoff)):
+            if await swap_in_rollup_bucket(bucket):
+                rebuilt.append(bucket["_id"])
+        # Closed buckets whose raw events are all gone
+        await db.analytics_rollups.delete_many({
+            "bucket": {"$gte": start_date},
+            "compacted": {"$ne": True},
+            "_id": {"$nin": rebuilt},
+            **closed_rollup_buckets(cutoff),
+        })
+    finally:
+        await staging.drop()
+
+    return {
+        "success": True,
+        "processed_events": processed,
+        "rebuilt_buckets": len(rebuilt),
+        "since": start_date.isoformat(),
+        "until": cutoff.isoformat(),
+    }
+
+
+# Metric -> event_type it counts (None: distinct sessions across all events)
+TIMESERIES_METRICS = {
+    "pageviews": "pageview",
+    "clicks": "click",
+    "conversions": "conversion",
+    "sessions": None,
+}
+TIMESERIES_SPLITS = ("device_type", "traffic_source", "source_detail", "browser", "os", "country", "city")
+TIMESERIES_MAX_HOURLY_DAYS = 31
+TIMESERIES_MAX_SERIES = 10
+
+
+def timeseries_pipeline(metric: str, granularity: str, start: datetime, end: datetime, split_by: Optional[str]) -> List[Dict[str, Any]]:
+    match: Dict[str, Any] = {"timestamp": {"$gte": start, "$lte": end}}
+    event_type = TIMESERIES_METRICS[metric]
+    if event_type:
+        match["event_type"] = event_type
+
+    group_id: Dict[str, Any] = {"bucket": {"$dateTrunc": {"date": "$timestamp", "unit": granularity, "timezone": "UTC"}}}
+    if split_by:
+        group_id["split"] = {"$ifNull": [f"${split_by}", ROLLUP_DIMENSIONS[split_by]]}
+
+    weight: Any = {"$ifNull": ["$sample_weight", 1]}
+    pipeline: List[Dict[str, Any]] = [{"$match": match}]
+    if event_type is None:
+        # Distinct sessions per bucket (and split value), each with its sample weight
+        pipeline.append({"$group": {"_id": {**group_id, "session": "$session_id"}, "weight": {"$max": weight}}})
+        group_id = {key: f"$_id.{key}" for key in group_id}
+        weight = "$weight"
+    pipeline.append({"$group": {"_id": group_id, "value": {"$sum": weight}}})
+    return pipeline
+
+
+def archive_timeseries_rows(metric: str, granularity: str, start: datetime, end: datetime, split_by: Optional[str]) -> List[Dict[str, Any]]:
+    """timeseries_pipeline output rows computed from archived Parquet partitions"""
+    event_type = TIMESERIES_METRICS[metric]
+    columns = ["timestamp", "session_id", "sample_weight"] + ([split_by] if split_by else [])
+    frame = read_analytics_archive(start, end, columns, {"event_type": event_type} if event_type else None)
+    if not len(frame):
+        return []
+
+    frame["bucket"] = frame["timestamp"].dt.floor("h" if granularity == "hour" else "D")
+    frame["sample_weight"] = frame["sample_weight"].fillna(1.0)
+    keys = ["bucket"]
+    if split_by:
+        frame["split"] = frame[split_by].fillna(ROLLUP_DIMENSIONS[split_by])
+        keys.append("split")
+    if event_type is None:
+        frame = frame.groupby([*keys, "session_id"], as_index=False)["sample_weight"].max()
+    values = frame.groupby(keys)["sample_weight"].sum()
+
+    rows = []
+    for key, value in values.items():
+        key = key if isinstance(key, tuple) else (key,)
+        row_id = {"bucket": key[0].to_pydatetime()}
+        if split_by:
+            row_id["split"] = key[1]
+        rows.append({"_id": row_id, "value": float(value)})
+    return rows
+
+
+def rollup_timeseries_rows(buckets: List[Dict[str, Any]], metric: str) -> List[Dict[str, Any]]:
+    """
+    timeseries_pipeline output rows computed from closed rollup buckets.
+    Sessions are HyperLogLog estimates scaled by the bucket's average sample
+    weight, as in the stats endpoint. Blocking; call it through asyncio.to_thread.
+    """
+    event_type = TIMESERIES_METRICS[metric]
+    rows = []
+    for bucket in buckets:
+        if event_type:
+            value = (bucket.get("event_type") or {}).get(encode_rollup_key(event_type), 0)
+        else:
+            sessions = HyperLogLog()
+            sessions.merge_sparse(bucket.get("hll") or {})
+            sampled = bucket.get("sampled_events", bucket.get("events", 0))
+            value = sessions.count() * (bucket.get("events", 0) / sampled if sampled else 1)
+        rows.append({"_id": {"bucket": bucket["bucket"]}, "value": value})
+    return rows
+
+
+def analytics_raw_horizon() -> Optional[datetime]:
+    """Start of the oldest day whose raw events (and hour buckets) retention keeps; None without retention"""
+    if ANALYTICS_RAW_RETENTION_DAYS <= 0:
+        return None
+    return rollup_bucket_start(datetime.now(timezone.utc) - timedelta(days=ANALYTICS_RAW_RETENTION_DAYS), "day")
+
+
+@api_router.get("/analytics/timeseries")
+async def get_analytics_timeseries(
+    metric: str = "pageviews",
+    granularity: str = "day",
+    period: int = Query(30, ge=1, le=ANALYTICS_MAX_PERIOD_DAYS),
+    split_by: Optional[str] = None
+):
+    """
+    Time-bucketed analytics counts for charts.
+    metric: pageviews, sessions, clicks or conversions
+    granularity: hour (up to 31 days) or day
+    split_by: optional dimension (device_type, traffic_source, ...); the ten
+    largest values get their own series, the rest are summed into "Other"
+
+    Returns one dense, zero-filled value array per series aligned with
+    `buckets` (bucket start times, UTC).
+
+    Unsplit series read closed buckets from the rollups and only the open
+    edge from raw events, so they reach back past the retention horizon.
+    Rollup dimension maps count every event type and have no per-value
+    session sketches, so split and hourly series need raw events: they are
+    limited to the retention horizon.
+    """
+    if metric not in TIMESERIES_METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Allowed: {', '.join(TIMESERIES_METRICS)}")
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Invalid granularity. Allowed: hour, day")
+    if split_by and split_by not in TIMESERIES_SPLITS:
+        raise HTTPException(status_code=400, detail=f"Invalid split_by. Allowed: {', '.join(TIMESERIES_SPLITS)}")
+    if period < 1 or (granularity == "hour" and period > TIMESERIES_MAX_HOURLY_DAYS):
+        raise HTTPException(status_code=400, detail=f"Invalid period (hourly series cover at most {TIMESERIES_MAX_HOURLY_DAYS} days)")
+
+    end_date = datetime.now(timezone.utc)
+    start_date = rollup_bucket_start(end_date - timedelta(days=period), granularity)
+    raw_horizon = analytics_raw_horizon()
+    if (split_by or granularity == "hour") and raw_horizon and start_date < raw_horizon:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Raw events are kept for {ANALYTICS_RAW_RETENTION_DAYS} days; longer periods are only available as daily totals without split_by"
+        )
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+
+    buckets = []
+    bucket = start_date
+    while bucket <= end_date:
+        buckets.append(bucket)
+        bucket += step
+    positions = {bucket: index for index, bucket in enumerate(buckets)}
+
+    if split_by:
+        raw_start = start_date
+        rows = await asyncio.to_thread(archive_timeseries_rows, metric, granularity, start_date, end_date, split_by)
+    else:
+        # Closed buckets from the rollups, the open edge from raw events
+        raw_start = max(start_date, rollup_bucket_start(closed_rollup_cutoff(), granularity))
+        event_type = TIMESERIES_METRICS[metric]
+        projection = {"_id": 0, "bucket": 1, "events": 1, "sampled_events": 1, "hll": 1} if event_type is None else {
+            "_id": 0, "bucket": 1, f"event_type.{encode_rollup_key(event_type)}": 1
+        }
+        closed_buckets = await db.analytics_rollups.find(
+            {"granularity": granularity, "bucket": {"$gte": start_date, "$lt": raw_start}}, projection
+        ).to_list(None)
+        rows = await asyncio.to_thread(rollup_timeseries_rows, closed_buckets, metric)
+
+    cursor = db.analytics_events.aggregate(
+        timeseries_pipeline(metric, granularity, raw_start, end_date, split_by), allowDiskUse=True
+    )
+    rows.extend(await cursor.to_list(None))
+
+    series: Dict[str, List[float]] = defaultdict(lambda: [0] * len(buckets))
+    for row in rows:
+        position = positions.get(as_utc(row["_id"]["bucket"]))
+        if position is None:
+            continue
+        name = str(row["_id"].get("split", "total")) if split_by else "total"
+        series[name][position] += row["value"]
+
+    if split_by and len(series) > TIMESERIES_MAX_SERIES:
+        ranked = sorted(series, key=lambda name: -sum(series[name]))
+        other = [0] * len(buckets)
+        for name in ranked[TIMESERIES_MAX_SERIES:]:
+            other = [a + b for a, b in zip(other, series.pop(name))]
+        series["Other"] = other
+    if not series:
+        series["total"] = [0] * len(buckets)
+    # Values are sums of sample weights; report whole numbers
+    series = {name: [int(round(value)) for value in values] for name, values in series.items()}
+
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "period": period,
+        "split_by": split_by,
+        "buckets": [bucket.isoformat() for bucket in buckets],
+        "series": [
+            {"name": name, "values": values, "total": sum(values)}
+            for name, values in sorted(series.items(), key=lambda item: -sum(item[1]))
+        ],
+    }
+
+
+ANALYTICS_BREAKDOWN_FIELDS = tuple(field for field in ANALYTICS_COLUMN_FIELDS if field != "session_id")
+ANALYTICS_BREAKDOWN_MAX_FIELDS = 3
+
+
+@api_router.get("/analytics/breakdown")
+async def get_analytics_breakdown(
+    period: int = Query(30, ge=1, le=ANALYTICS_MAX_PERIOD_DAYS),
+    group_by: str = "device_type",
+    event_type: Optional[str] = None,
+    limit: int = 50
+):
+    """
+    Ad-hoc breakdown of raw events over the last `period` days.
+    group_by: up to three comma-separated fields, e.g. "country,device_type"
+    event_type: only count events of this type
+
+    Runs on the cached column batch of the period, so repeated or differently
+    grouped queries within the cache TTL do not touch MongoDB.
+    """
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    invalid = [field for field in fields if field not in ANALYTICS_BREAKDOWN_FIELDS]
+    if invalid or len(fields) > ANALYTICS_BREAKDOWN_MAX_FIELDS or len(set(fields)) != len(fields):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid group_by. Up to {ANALYTICS_BREAKDOWN_MAX_FIELDS} of: {', '.join(ANALYTICS_BREAKDOWN_FIELDS)}"
+        )
+    if period < 1:
+        raise HTTPException(status_code=400, detail="Invalid period")
+
+    columns = await analytics_columns.get(period)
+    started = time.perf_counter()
+    grouped = columns.group(fields, columns.mask({"event_type": event_type} if event_type else {}))
+    order = np.argsort(-grouped["events"], kind="stable")[:max(limit, 0)]
+
+    return {
+        "period": period,
+        "group_by": fields,
+        "event_type": event_type,
+        "total_events": int(round(grouped["events"].sum())),
+        "groups": len(grouped["events"]),
+        "rows": [
+            {
+                **{field: grouped[field][index] for field in fields},
+                "events": int(round(grouped["events"][index])),
+                "sessions": int(round(grouped["sessions"][index])),
+            }
+            for index in order
+        ],
+        "loaded_at": columns.loaded_at.isoformat(),
+        "compute_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+ANALYTICS_EXPORT_BATCH_SIZE = 1000
+
+ANALYTICS_EXPORT_FIELDS = [
+    "id", "session_id", "event_type", "timestamp", "page_url", "page_title", "button_id", "button_text",
+    "device_type", "browser", "os", "country", "city", "referrer", "traffic_source", "source_detail",
+    "session_duration", "is_new_visitor", "is_returning", "conversion_type", "conversion_value",
+    "sample_weight",
+]
+
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return as_utc(value).isoformat()
+    return value
+
+
+def archive_export_batches(start: Optional[datetime], end: Optional[datetime]):
+    """
+    Archived events with start <= timestamp <= end (both optional) as lists
+    of export rows, one per Parquet batch, oldest partition first. Blocking
+    generator; advance it through asyncio.to_thread.
+    """
+    if not ANALYTICS_ARCHIVE_DIR.exists():
+        return
+
+    import pyarrow.dataset as ds
+
+    expression = None
+    if start:
+        expression = ds.field("timestamp") >= start
+    if end:
+        expression = (ds.field("timestamp") <= end) if expression is None else expression & (ds.field("timestamp") <= end)
+    columns = [field for field in ANALYTICS_EXPORT_FIELDS if field in ANALYTICS_ARCHIVE_FIELDS]
+
+    for path in sorted(ANALYTICS_ARCHIVE_DIR.glob("year=*/month=*/events.parquet")):
+        month = archive_partition_month(path)
+        if (start and add_months(month, 1) <= start) or (end and month > end):
+            continue
+        dataset = ds.dataset(str(path), schema=archive_schema(), format="parquet")
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=ANALYTICS_EXPORT_BATCH_SIZE):
+            if batch.num_rows:
+                yield batch.to_pylist()
+
+
+async def stream_analytics_export(start: Optional[datetime], end: Optional[datetime], export_format: str):
+    """
+    Yield export chunks of the archived partitions of the range, then
+    straight from a cursor over analytics_events; one chunk per batch
+    """
+    query: Dict[str, Any] = {}
+    time_range = {}
+    if start:
+        time_range["$gte"] = start
+    if end:
+        time_range["$lte"] = end
+    if time_range:
+        query["timestamp"] = time_range
+
+    buffer = io.StringIO()
+    writer = None
+    if export_format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=ANALYTICS_EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+
+    def write(event: Dict[str, Any]) -> None:
+        event = {key: export_value(value) for key, value in event.items()}
+        if writer:
+            writer.writerow(event)
+        else:
+            buffer.write(json.dumps(event, ensure_ascii=False))
+            buffer.write("\n")
+
+    archived = archive_export_batches(start, end)
+    while True:
+        batch = await asyncio.to_thread(next, archived, None)
+        if batch is None:
+            break
+        for event in batch:
+            write(event)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    cursor = db.analytics_events.find(
+        query, {"_id": 0, **{field: 1 for field in ANALYTICS_EXPORT_FIELDS}}
+    ).sort("timestamp", 1).batch_size(ANALYTICS_EXPORT_BATCH_SIZE)
+    rows = 0
+    async for event in cursor:
+        write(event)
+        rows += 1
+        if rows % ANALYTICS_EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@api_router.get("/analytics/export")
+async def export_analytics_events(
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    export_format: str = Query("ndjson", alias="format")
+):
+    """
+    Stream raw analytics events as NDJSON or CSV.
+    from / to: ISO dates or datetimes (UTC if no offset given); both optional.
+    Events are read in batches of 1000 (archived Parquet months first, then
+    a cursor over analytics_events) and written out as they arrive, so
+    memory stays flat for any range.
+    """
+    if export_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Invalid format. Allowed: ndjson, csv")
+
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_analytics_export(as_utc(from_date) if from_date else None, as_utc(to_date) if to_date else None, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="analytics_events.{export_format}"'}
+    )
+
+
+@api_router.delete("/analytics/clear")
+async def clear_analytics_data(
+    from_date: Optional[datetime] = Query(None, alias="from"),
+    to_date: Optional[datetime] = Query(None, alias="to"),
+    chunk_size: int = ANALYTICS_PURGE_CHUNK_SIZE,
+    throttle_ms: int = ANALYTICS_PURGE_THROTTLE_MS
+):
+    """
+    Purge analytics data (admin only) as a background job.
+    from / to: optional ISO dates or datetimes limiting the purge; without
+    them every event recorded so far is removed, along with rollups,
+    sessions and the Parquet archive.
+    Returns the job id; follow progress at /analytics/jobs/{job_id}.
+    """
+    if not 1 <= chunk_size <= ANALYTICS_PURGE_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail=f"chunk_size must be between 1 and {ANALYTICS_PURGE_MAX_CHUNK_SIZE}")
+    if not 0 <= throttle_ms <= ANALYTICS_PURGE_MAX_THROTTLE_MS:
+        raise HTTPException(status_code=400, detail=f"throttle_ms must be between 0 and {ANALYTICS_PURGE_MAX_THROTTLE_MS}")
+
+    now = datetime.now(timezone.utc)
+    end = min(as_utc(to_date), now) if to_date else now
+    start = as_utc(from_date) if from_date else None
+    if start and start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+
+    job = {
+        "id": str(uuid.uuid4()),
+        "type": "purge",
+        "status": "pending",
+        "from": start,
+        "to": end,
+        "chunk_size": chunk_size,
+        "throttle_ms": throttle_ms,
+        "deleted": 0,
+        "total": None,
+        "last_id": None,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    await db.analytics_jobs.insert_one(job)
+    # The job poller may claim it first; it then runs on that worker instead
+    claimed = await claim_analytics_job(job["id"])
+    if claimed:
+        spawn_background_task(run_analytics_purge(claimed))
+    return {"success": True, "job_id": job["id"], "status": claimed["status"] if claimed else job["status"]}
+
+
+@api_router.get("/analytics/jobs/{job_id}")
+async def get_analytics_job(job_id: str):
+    """Status and progress of a background analytics job"""
+    job = await db.analytics_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return analytics_job_status(job)
+
+
+@api_router.patch("/analytics/jobs/{job_id}")
+async def update_analytics_job(job_id: str, chunk_size: Optional[int] = None, throttle_ms: Optional[int] = None):
+    """Change the pace of a running job; applied from its next chunk"""
+    update: Dict[str, Any] = {}
+    if chunk_size is not None:
+        if not 1 <= chunk_size <= ANALYTICS_PURGE_MAX_CHUNK_SIZE:
+            raise HTTPException(status_code=400, detail=f"chunk_size must be between 1 and {ANALYTICS_PURGE_MAX_CHUNK_SIZE}")
+        update["chunk_size"] = chunk_size
+    if throttle_ms is not None:
+        if not 0 <= throttle_ms <= ANALYTICS_PURGE_MAX_THROTTLE_MS:
+            raise HTTPException(status_code=400, detail=f"throttle_ms must be between 0 and {ANALYTICS_PURGE_MAX_THROTTLE_MS}")
+        update["throttle_ms"] = throttle_ms
+    if not update:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+
+    job = await db.analytics_jobs.find_one_and_update(
+        {"id": job_id}, {"$set": update}, {"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return analytics_job_status(job)
+
+
+@api_router.post("/analytics/retention/run")
+async def run_analytics_retention(retention_days: Optional[int] = None):
+    """Run the raw-event retention pass now (defaults to ANALYTICS_RAW_RETENTION_DAYS)"""
+    return await apply_analytics_retention(ANALYTICS_RAW_RETENTION_DAYS if retention_days is None else retention_days)
+
+
+@api_router.post("/analytics/archive/run")
+async def run_analytics_archive(after_months: Optional[int] = None):
+    """Move closed months to Parquet now (defaults to ANALYTICS_ARCHIVE_AFTER_MONTHS)"""
+    return await archive_closed_analytics_months(ANALYTICS_ARCHIVE_AFTER_MONTHS if after_months is None else after_months)
+
+
+@api_router.get("/analytics/archive")
+async def get_analytics_archive():
+    """Archived monthly partitions with their row counts and file sizes"""
+    if not ANALYTICS_ARCHIVE_DIR.exists():
+        return {"directory": str(ANALYTICS_ARCHIVE_DIR), "partitions": []}
+
+    import pyarrow.parquet as pq
+
+    partitions = []
+    for path in sorted(ANALYTICS_ARCHIVE_DIR.glob("year=*/month=*/events.parquet")):
+        partitions.append({
+            "month": archive_partition_month(path).strftime("%Y-%m"),
+            "events": pq.ParquetFile(path).metadata.num_rows,
+            "bytes": path.stat().st_size,
+        })
+    return {"directory": str(ANALYTICS_ARCHIVE_DIR), "partitions": partitions}
+
+
+@api_router.get("/analytics/enrichment-cache")
+async def get_enrichment_cache_stats():
+    """Hit/miss counters of the user agent, referrer and GeoIP caches"""
+    return enrichment_cache_stats()
+
+
+@api_router.post("/analytics/geoip/reload")
+async def reload_geoip_table():
+    """Re-map GEOIP_TABLE_PATH after the table file was replaced"""
+    loaded = load_geoip_table()
+    return {"success": loaded, "ranges": geoip_table.count if geoip_table else 0}
+
+
+@api_router.get("/analytics/realtime")
+async def get_analytics_realtime(limit: int = 10):
+    """
+    Active sessions over the last 1, 5 and 30 minutes and the most viewed
+    pages of the last 5 minutes: this worker's traffic, or with
+    REALTIME_SHARED=on every worker's (to REALTIME_SLOT_SECONDS)
+    """
+    return await realtime_visitors.snapshot(limit)
+
+
+@api_router.get("/analytics/bots")
+async def get_analytics_bots(period: int = Query(30, ge=1, le=ANALYTICS_MAX_PERIOD_DAYS), limit: int = 20):
+    """Filtered crawler and automation hits per day and by agent"""
+    if period < 1:
+        raise HTTPException(status_code=400, detail="period must be at least 1 day")
+    first_day = (datetime.now(timezone.utc) - timedelta(days=period - 1)).strftime("%Y-%m-%d")
+
+    daily: Counter = Counter()
+    agents: Counter = Counter()
+    async for doc in db.analytics_bot_counters.find({"_id": {"$gte": first_day}}):
+        daily[doc["_id"]] += doc.get("total", 0)
+        agents.update({decode_rollup_key(key): count for key, count in (doc.get("agents") or {}).items()})
+    # Hits not flushed yet
+    for day, pending in analytics_bot_tally.pending.items():
+        if day >= first_day:
+            daily[day] += sum(pending.values())
+            agents.update(pending)
+
+    return {
+        "filtering": ANALYTICS_BOT_FILTERING,
+        "period": period,
+        "total": sum(daily.values()),
+        "daily": [{"date": day, "count": count} for day, count in sorted(daily.items())],
+        "agents": top_counts(agents, label="agent", limit=limit, exclude=()),
+        "filtered_since_start": analytics_bot_tally.filtered,
+    }
+
+
+@api_router.get("/analytics/sampling")
+async def get_analytics_sampling():
+    """Current sampling mode and rate, with kept and sampled-out event counts"""
+    return analytics_sampler.stats()
+
+
+@api_router.get("/analytics/buffer")
+async def get_analytics_buffer_stats():
+    """Write-behind buffer counters (queue depth, flushed, dropped, failed)"""
+    return analytics_buffer.stats()
+
+
+# ==================== EXISTING ROUTES ====================
+
+@api_router.get("/")
+async def root():
+    return {"message": "Hello World"}
+
+@api_router.post("/status", response_model=StatusCheck)
+async def create_status_check(input: StatusCheckCreate):
+    status_dict = input.model_dump()
+    status_obj = StatusCheck(**status_dict)
+    doc = status_obj.model_dump()
+    doc['timestamp'] = doc['timestamp'].isoformat()
+    _ = await db.status_checks.insert_one(doc)
+    return status_obj
+
+@api_router.get("/status", response_model=List[StatusCheck])
+async def get_status_checks():
+    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
+    for check in status_checks:
+        if isinstance(check['timestamp'], str):
+            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
+    return status_checks
+
+
+# ==================== EVOLUTION LEVELS API ====================
+
+class EvolutionLevel(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid4()))
+    rank_ru: str
+    rank_en: str
+    fomo_score_min: int
+    fomo_score_max: int
+    next_level_ru: str
+    next_level_en: str
+    description_ru: str
+    description_en: str
+    animation_type: str = "stellar"
+    animation_speed: str = "normal"  # slow, normal, fast
+    animation_intensity: str = "normal"  # subtle, normal, intense
+    gradient_from: str = "#64748b"
+    gradient_to: str = "#475569"
+    order: int = 0
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class EvolutionLevelCreate(BaseModel):
+    rank_ru: str
+    rank_en: str
+    fomo_score_min: int
+    fomo_score_max: int
+    next_level_ru: str
+    next_level_en: str
+    description_ru: str
+    description_en: str
+    animation_type: str = "stellar"
     animation_speed: str = "normal"
     animation_intensity: str = "normal"
     gradient_from: str = "#64748b"
@@ -2681,6 +5609,215 @@ async def delete_navigation_item(item_id: str):
     return {"message": "Navigation item deleted"}
 
 
+# ==================== BOOTSTRAP API ====================
+
+BOOTSTRAP_MAX_AGE_SECONDS = int(os.environ.get('BOOTSTRAP_MAX_AGE_SECONDS', '30'))
+BOOTSTRAP_LANGUAGES = ("ru", "en")
+
+# Section -> (getter, response model of its own endpoint, if any)
+BOOTSTRAP_SECTIONS = {
+    "hero_settings": (get_hero_settings, None),
+    "hero_buttons": (get_hero_buttons, List[HeroButton]),
+    "navigation_items": (get_navigation_items, List[NavigationItem]),
+    "platform_settings": (get_platform_settings, None),
+    "drawer_cards": (get_drawer_cards, List[DrawerCard]),
+    "team_members": (get_team_members, List[TeamMember]),
+    "roadmap": (get_roadmap, None),
+    "partners": (get_partners, None),
+    "faq": (get_faq_items, None),
+    "community_settings": (get_community_settings, None),
+    "about_settings": (get_about_settings, None),
+    "footer_settings": (get_footer_settings, None),
+}
+BOOTSTRAP_ADAPTERS = {section: TypeAdapter(model) for section, (_, model) in BOOTSTRAP_SECTIONS.items() if model}
+
+
+def localize_content(value: Any, lang: str) -> Any:
+    """Drop `<field>_<other language>` keys wherever `<field>_<lang>` is present"""
+    if isinstance(value, list):
+        return [localize_content(item, lang) for item in value]
+    if not isinstance(value, dict):
+        return value
+    localized = {}
+    for key, item in value.items():
+        base, _, suffix = key.rpartition("_")
+        if suffix in BOOTSTRAP_LANGUAGES and suffix != lang and f"{base}_{lang}" in value:
+            continue
+        localized[key] = localize_content(item, lang)
+    return localized
+
+
+@api_router.get("/bootstrap")
+async def get_bootstrap(lang: Optional[str] = None):
+    """
+    Everything the landing page renders, in one response: the sections are
+    read concurrently and serialized exactly like their own endpoints. With
+    lang=ru|en the other language's fields are left out. A failing section
+    is returned as null and listed in "errors", and the response is then not
+    cached. Compression is left to the response cache.
+    """
+    if lang is not None and lang not in BOOTSTRAP_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Invalid lang. Allowed: {', '.join(BOOTSTRAP_LANGUAGES)}")
+
+    results = await asyncio.gather(*(getter() for getter, _ in BOOTSTRAP_SECTIONS.values()), return_exceptions=True)
+    content: Dict[str, Any] = {}
+    errors = []
+    for section, result in zip(BOOTSTRAP_SECTIONS, results):
+        if isinstance(result, Exception):
+            logger.error(f"Bootstrap section {section} failed: {result}")
+            content[section] = None
+            errors.append(section)
+            continue
+        adapter = BOOTSTRAP_ADAPTERS.get(section)
+        if adapter:
+            result = adapter.dump_python(adapter.validate_python(result), mode="json")
+        content[section] = jsonable_encoder(result)
+    if lang:
+        content = localize_content(content, lang)
+    content["errors"] = errors
+
+    body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    cache_control = "no-store" if errors else f"public, max-age={BOOTSTRAP_MAX_AGE_SECONDS}"
+    return Response(content=body, media_type="application/json", headers={"Cache-Control": cache_control})
+
+
+# ==================== DATABASE INDEXES ====================
+
+def unique_id_index() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], unique=True)
+
+def order_index() -> IndexModel:
+    return IndexModel([("order", ASCENDING)])
+
+# Every index server.py relies on, per collection. Applied on startup;
+# anything found in the database that differs from this is logged.
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "drawer_cards": [unique_id_index(), order_index()],
+    "team_members": [unique_id_index(), order_index()],
+    "partners": [
+        unique_id_index(),
+        order_index(),
+        IndexModel([("category", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "faq_items": [unique_id_index(), order_index()],
+    "roadmap_tasks": [order_index()],
+    "evolution_levels": [unique_id_index(), order_index()],
+    "evolution_badges": [unique_id_index(), order_index()],
+    "hero_buttons": [
+        unique_id_index(),
+        IndexModel([("is_active", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "navigation_items": [
+        unique_id_index(),
+        IndexModel([("is_active", ASCENDING), ("order", ASCENDING)]),
+    ],
+    "p2p_deals": [
+        unique_id_index(),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("deal_type", ASCENDING)]),
+        IndexModel([("crypto_type", ASCENDING)]),
+    ],
+    "arena_predictions": [
+        unique_id_index(),
+        IndexModel([("category", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "influence_entities": [
+        unique_id_index(),
+        IndexModel([("entity_type", ASCENDING)]),
+        IndexModel([("is_suggested", ASCENDING)]),
+    ],
+    "earlyland_opportunities": [
+        unique_id_index(),
+        IndexModel([("category", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    # Settings singletons
+    "platform_settings": [unique_id_index()],
+    "footer_settings": [unique_id_index()],
+    "community_settings": [unique_id_index()],
+    "hero_settings": [unique_id_index()],
+    "about_settings": [unique_id_index()],
+    "roadmap_settings": [unique_id_index()],
+    # Analytics
+    "analytics_events": [
+        IndexModel([("timestamp", ASCENDING)]),
+        IndexModel([("event_type", ASCENDING), ("timestamp", ASCENDING)]),
+    ],
+    "analytics_sessions": [
+        IndexModel([("session_id", ASCENDING)], unique=True),
+        IndexModel([("last_seen", ASCENDING)]),
+    ],
+    "analytics_rollups": [
+        IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING)]),
+    ],
+    "analytics_jobs": [
+        unique_id_index(),
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    "analytics_realtime": [
+        IndexModel([("at", ASCENDING)], expireAfterSeconds=REALTIME_WINDOW_SECONDS + REALTIME_SLOT_SECONDS),
+    ],
+}
+
+# Index options that make two indexes on the same keys behave differently
+INDEX_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+async def apply_index_registry() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Create missing registry indexes and log drift: declared indexes whose
+    keys or options differ in the database, and undeclared extra indexes.
+    Indexes are created one by one so a single failure (e.g. duplicate ids
+    blocking a unique index) does not hold back the rest.
+    """
+    report: Dict[str, Dict[str, List[str]]] = {}
+    for collection_name, models in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        created, drifted, failed = [], [], []
+
+        for model in models:
+            spec = model.document
+            name = spec["name"]
+            keys = list(spec["key"].items())
+            current = existing.get(name)
+            if current is None:
+                same_keys = [other for other, info in existing.items() if list(info["key"]) == keys]
+                if same_keys:
+                    drifted.append(name)
+                    logger.warning(f"Index drift on {collection_name}: {name} exists as {same_keys[0]}")
+                    continue
+                try:
+                    await collection.create_indexes([model])
+                    created.append(name)
+                except OperationFailure as e:
+                    failed.append(name)
+                    logger.error(f"Could not create index {collection_name}.{name}: {e}")
+                continue
+
+            differences = [
+                option for option in INDEX_COMPARED_OPTIONS
+                if spec.get(option) != current.get(option) and (spec.get(option) or current.get(option))
+            ]
+            if list(current["key"]) != keys:
+                differences.insert(0, "key")
+            if differences:
+                drifted.append(name)
+                logger.warning(f"Index drift on {collection_name}.{name}: {', '.join(differences)} differ from registry")
+
+        declared = {model.document["name"] for model in models}
+        extra = [name for name in existing if name != "_id_" and name not in declared]
+        for name in extra:
+            logger.info(f"Undeclared index {collection_name}.{name}")
+
+        report[collection_name] = {"created": created, "drifted": drifted, "failed": failed, "extra": extra}
+        if created:
+            logger.info(f"Created indexes on {collection_name}: {', '.join(created)}")
+
+    return report
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -2699,6 +5836,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_tasks():
+    load_geoip_table()
+    await apply_index_registry()
+    analytics_buffer.start()
+    spawn_background_task(backfill_analytics_timestamps())
+    spawn_background_task(run_analytics_jobs_loop())
+    if REALTIME_SHARED:
+        spawn_background_task(run_realtime_flush_loop())
+    if ANALYTICS_BOT_FILTERING == "on":
+        spawn_background_task(run_bot_tally_loop())
+    if ANALYTICS_RAW_RETENTION_DAYS > 0 or ANALYTICS_ARCHIVE_AFTER_MONTHS > 0:
+        spawn_background_task(run_analytics_retention_loop())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await analytics_buffer.stop()
+    await analytics_bot_tally.flush()
+    await realtime_visitors.flush()
     client.close()
\ No newline at end of file
@@ -806,6 +806,18 @@ const AnalyticsAdminContent = () => {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [period, setPeriod] = useState(30);
+  const [clearProgress, setClearProgress] = useState(null);
+
+  // The purge runs as a background job: poll it until it finishes
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const { data: job } = await axios.get(`${API}/analytics/jobs/${jobId}`);
+      if (job.status === 'completed') return job;
+      if (job.status === 'failed') throw new Error(job.error || 'Analytics job failed');
+      setClearProgress(job.progress);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
 
   const fetchStats = async (days) => {
     setLoading(true);
@@ -1222,14 +1234,19 @@ const AnalyticsAdminContent = () => {
       {/* Clear Data Button */}
       <div style={{ textAlign: 'center', paddingTop: '20px', borderTop: '1px solid #e5e7eb' }}>
         <button
+          disabled={clearProgress !== null}
           onClick={async () => {
             if (window.confirm('Вы уверены, что хотите очистить все данные аналитики?')) {
+              setClearProgress(0);
               try {
-                await axios.delete(`${API}/analytics/clear`);
-                fetchStats(period);
+                const response = await axios.delete(`${API}/analytics/clear`);
+                await waitForJob(response.data.job_id);
+                await fetchStats(period);
                 alert('Данные успешно очищены');
               } catch (error) {
                 alert('Ошибка при очистке данных');
+              } finally {
+                setClearProgress(null);
               }
             }
           }}
@@ -1241,10 +1258,11 @@ const AnalyticsAdminContent = () => {
             borderRadius: '10px',
             fontSize: '14px',
             fontWeight: '600',
-            cursor: 'pointer'
+            cursor: clearProgress !== null ? 'wait' : 'pointer',
+            opacity: clearProgress !== null ? 0.7 : 1
           }}
         >
-          🗑️ Очистить все данные
+          {clearProgress !== null ? `⏳ Очистка... ${Math.round(clearProgress)}%` : '🗑️ Очистить все данные'}
         </button>
       </div>
     </div>
@@ -5409,15 +5427,11 @@ const AnimatedIcon = ({ type, className = "" }) => {
 };
 
 // Navigation Component - без кнопок админки (админка на отдельной странице /admin)
-const Navigation = () => {
+// navigationItems and heroSettings come from /bootstrap: undefined while it
+// loads, null when the section failed
+const Navigation = ({ navigationItems, heroSettings }) => {
   const [scrolled, setScrolled] = useState(false);
   const [mobileMenuOpen, setMobileMenuOpen] = useState(false);
-  const [navItems, setNavItems] = useState([]);
-  const [actionButtons, setActionButtons] = useState({
-    crypto: { label: 'Crypto', url: '#crypto' },
-    core: { label: 'Core', url: '#core' },
-    utility: { label: 'Utility', url: '#utility' }
-  });
   const { language, toggleLanguage } = useLanguage();
   const t = useTranslation();
 
@@ -5427,46 +5441,25 @@ const Navigation = () => {
     return () => window.removeEventListener('scroll', handleScroll);
   }, []);
 
-  // Fetch navigation items from API
-  useEffect(() => {
-    const fetchNavItems = async () => {
-      try {
-        const response = await axios.get(`${API}/navigation-items`);
-        const items = response.data.map(item => ({
-          key: item.key,
-          label: language === 'ru' ? item.label_ru : item.label_en,
-          href: item.href
-        }));
-        setNavItems(items);
-      } catch (error) {
-        console.error('Error fetching navigation items:', error);
-        // Fallback to default items
-        setNavItems([
-          { key: 'about', label: t('nav.about'), href: '#about' },
-          { key: 'projects', label: t('nav.platform'), href: '#projects' },
-          { key: 'roadmap', label: t('nav.roadmap'), href: '#roadmap' },
-          { key: 'team', label: t('nav.team'), href: '#team' },
-          { key: 'partners', label: t('nav.partners'), href: '#partners' }
-        ]);
-      }
-    };
-    fetchNavItems();
-  }, [language, t]);
+  const navItems = navigationItems === undefined ? [] : navigationItems ? navigationItems.map(item => ({
+    key: item.key,
+    label: language === 'ru' ? item.label_ru : item.label_en,
+    href: item.href
+  })) : [
+    // Fallback to default items
+    { key: 'about', label: t('nav.about'), href: '#about' },
+    { key: 'projects', label: t('nav.platform'), href: '#projects' },
+    { key: 'roadmap', label: t('nav.roadmap'), href: '#roadmap' },
+    { key: 'team', label: t('nav.team'), href: '#team' },
+    { key: 'partners', label: t('nav.partners'), href: '#partners' }
+  ];
 
-  // Fetch action buttons from hero settings
-  useEffect(() => {
-    const fetchActionButtons = async () => {
-      try {
-        const response = await axios.get(`${API}/hero-settings`);
-        if (response.data?.action_buttons) {
-          setActionButtons(response.data.action_buttons);
-        }
-      } catch (error) {
-        console.error('Error fetching action buttons:', error);
-      }
-    };
-    fetchActionButtons();
-  }, []);
+  // Action buttons from hero settings
+  const actionButtons = heroSettings?.action_buttons || {
+    crypto: { label: 'Crypto', url: '#crypto' },
+    core: { label: 'Core', url: '#core' },
+    utility: { label: 'Utility', url: '#utility' }
+  };
 
   useEffect(() => {
     const handleScroll = () => {
@@ -5613,28 +5606,16 @@ const InteractiveChart = () => {
 
 // ==================== BUY NFT MODAL ====================
 // Hero Section
-const HeroSection = ({ heroSettings }) => {
-  const [heroButtons, setHeroButtons] = useState([]);
+// heroButtons comes from /bootstrap: undefined while it loads, null when it failed
+const HeroSection = ({ heroSettings, heroButtons: bootstrapButtons }) => {
   const t = useTranslation();
   const { language } = useLanguage();
-  
-  // Fetch hero buttons from API
-  useEffect(() => {
-    const fetchHeroButtons = async () => {
-      try {
-        const response = await axios.get(`${API}/hero-buttons`);
-        setHeroButtons(response.data);
-      } catch (error) {
-        console.error('Error fetching hero buttons:', error);
-        // Fallback to default buttons
-        setHeroButtons([
-          { id: '1', label: 'Explore Platform', url: 'https://example.com/explore', style: 'primary' },
-          { id: '2', label: 'Buy NFT', url: 'https://example.com/nft', style: 'secondary' }
-        ]);
-      }
-    };
-    fetchHeroButtons();
-  }, []);
+
+  const heroButtons = bootstrapButtons === undefined ? [] : bootstrapButtons || [
+    // Fallback to default buttons
+    { id: '1', label: 'Explore Platform', url: 'https://example.com/explore', style: 'primary' },
+    { id: '2', label: 'Buy NFT', url: 'https://example.com/nft', style: 'secondary' }
+  ];
   
   // Get stats from settings or use defaults
   const stats = heroSettings?.stats || [
@@ -5737,22 +5718,9 @@ const HeroSection = ({ heroSettings }) => {
 };
 
 // About Section
-const AboutSection = ({ whitepaperUrl }) => {
-  const [aboutSettings, setAboutSettings] = useState(null);
+const AboutSection = ({ aboutSettings, whitepaperUrl }) => {
   const { language } = useLanguage();
 
-  useEffect(() => {
-    const fetchAboutSettings = async () => {
-      try {
-        const response = await axios.get(`${API}/about-settings`);
-        setAboutSettings(response.data);
-      } catch (error) {
-        console.error('Error fetching about settings:', error);
-      }
-    };
-    fetchAboutSettings();
-  }, []);
-
   // Use settings from API or fallback to hardcoded
   const badge = aboutSettings?.badge || "About Us";
   const title = aboutSettings?.title || "What is";
@@ -8146,6 +8114,30 @@ const AdminPage = () => {
     }
   };
 
+  // Content responses may be served stale while revalidating; the admin must
+  // always see its own edits. GETs carry a version param that changes on
+  // mount and after every successful write, so the browser cache is skipped
+  // exactly then. A query param keeps the requests simple (no CORS preflight).
+  useEffect(() => {
+    let version = Date.now();
+    const requestInterceptor = axios.interceptors.request.use((config) => {
+      if (!config.method || config.method === 'get') {
+        config.params = { ...config.params, _v: version };
+      }
+      return config;
+    });
+    const responseInterceptor = axios.interceptors.response.use((response) => {
+      if (response.config.method && response.config.method !== 'get') {
+        version = Date.now();
+      }
+      return response;
+    });
+    return () => {
+      axios.interceptors.request.eject(requestInterceptor);
+      axios.interceptors.response.eject(responseInterceptor);
+    };
+  }, []);
+
   useEffect(() => {
     const token = localStorage.getItem('admin_token');
     if (token) {
@@ -8397,32 +8389,32 @@ const MainSite = () => {
   const [faqData, setFaqData] = useState([]);
   const [communitySettings, setCommunitySettings] = useState(null);
   const [heroSettings, setHeroSettings] = useState(null);
+  // undefined until /bootstrap answers, then the section or null
+  const [heroButtons, setHeroButtons] = useState(undefined);
+  const [navigationItems, setNavigationItems] = useState(undefined);
+  const [aboutSettings, setAboutSettings] = useState(null);
 
   useEffect(() => {
     const fetchAllData = async () => {
       try {
-        const [cardsRes, teamRes, platformRes, roadmapRes, partnersRes, footerRes, faqRes, communityRes, heroRes] = await Promise.all([
-          axios.get(`${API}/drawer-cards`),
-          axios.get(`${API}/team-members`),
-          axios.get(`${API}/platform-settings`),
-          axios.get(`${API}/roadmap`),
-          axios.get(`${API}/partners`),
-          axios.get(`${API}/footer-settings`),
-          axios.get(`${API}/faq`),
-          axios.get(`${API}/community-settings`),
-          axios.get(`${API}/hero-settings`)
-        ]);
-        setCards(cardsRes.data);
-        setTeam(teamRes.data);
-        setPlatformSettings(platformRes.data);
-        setRoadmapData(roadmapRes.data);
-        setPartnersData(partnersRes.data);
-        setFooterSettings(footerRes.data);
-        setFaqData(faqRes.data);
-        setCommunitySettings(communityRes.data);
-        setHeroSettings(heroRes.data);
+        // One request for every landing page section
+        const { data } = await axios.get(`${API}/bootstrap`);
+        setCards(data.drawer_cards || []);
+        setTeam(data.team_members || []);
+        setPlatformSettings(data.platform_settings);
+        setRoadmapData(data.roadmap);
+        setPartnersData(data.partners || []);
+        setFooterSettings(data.footer_settings);
+        setFaqData(data.faq || []);
+        setCommunitySettings(data.community_settings);
+        setHeroSettings(data.hero_settings);
+        setHeroButtons(data.hero_buttons);
+        setNavigationItems(data.navigation_items);
+        setAboutSettings(data.about_settings);
       } catch (err) {
         console.error('Error fetching data:', err);
+        setHeroButtons(null);
+        setNavigationItems(null);
       }
     };
     fetchAllData();
@@ -8430,9 +8422,9 @@ const MainSite = () => {
 
   return (
     <div className="App bg-white">
-      <Navigation />
-      <HeroSection heroSettings={heroSettings} />
-      <AboutSection whitepaperUrl={footerSettings?.whitepaper_url} />
+      <Navigation navigationItems={navigationItems} heroSettings={heroSettings} />
+      <HeroSection heroSettings={heroSettings} heroButtons={heroButtons} />
+      <AboutSection aboutSettings={aboutSettings} whitepaperUrl={footerSettings?.whitepaper_url} />
       <PlatformOverview platformSettings={platformSettings} />
       <MyProductsSection cards={cards} />
       <RoadmapSection roadmapData={roadmapData} />
@@ -15,6 +15,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from content_versions import bump_content_versions
+
 # MongoDB connection
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'test_database')
@@ -197,6 +199,7 @@ async def main():
         await migrate_roadmap_tasks()
         await migrate_team_members()
         await check_platform_settings()
+        await bump_content_versions(db, ("roadmap_tasks", "team_members"))
         
         print("\n✅ Migration completed successfully!\n")
     except Exception as e:
@@ -0,0 +1,56 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def patch_find_one_and_update(monkeypatch):
+    """
+    mongomock re-reads the updated document by _id, so a projection that
+    drops _id makes find_one_and_update return None. Apply the projection
+    afterwards instead.
+    """
+    from mongomock.collection import Collection
+
+    original = Collection.find_one_and_update
+
+    def find_one_and_update(self, filter, update, projection=None, *args, **kwargs):
+        doc = original(self, filter, update, None, *args, **kwargs)
+        if doc is not None and projection:
+            for field, include in projection.items():
+                if not include:
+                    doc.pop(field, None)
+        return doc
+
+    monkeypatch.setattr(Collection, "find_one_and_update", find_one_and_update)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """server.py against an in-memory MongoDB, with fresh process-level caches"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import analytics_store
+    import server as server_module
+
+    patch_find_one_and_update(monkeypatch)
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(server_module, "client", client)
+    monkeypatch.setattr(server_module, "db", client["test_database"])
+    monkeypatch.setattr(server_module, "content_versions", server_module.ContentVersions(0))
+    monkeypatch.setattr(server_module, "response_cache", server_module.ResponseCache(64, 300))
+    monkeypatch.setattr(server_module, "settings_cache", server_module.SettingsCache(300))
+    monkeypatch.setattr(analytics_store, "deferred_topk", type(analytics_store.deferred_topk)(dict))
+    server_module.session_index.clear()
+    server_module.analytics_columns.clear()
+    return server_module
@@ -0,0 +1,35 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def api(server, monkeypatch, tmp_path):
+    httpx = pytest.importorskip("httpx")
+    monkeypatch.setattr(server, "ANALYTICS_ARCHIVE_DIR", tmp_path)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
+
+
+async def test_export_includes_archived_months(api, server):
+    month = server.add_months(server.month_start(datetime.now(timezone.utc)), -3)
+    live = datetime.now(timezone.utc) - timedelta(hours=1)
+    await server.persist_analytics_events(server.db, [
+        *({"id": f"a{day}", "session_id": "s", "event_type": "pageview", "timestamp": month.replace(day=day, hour=12)}
+          for day in range(1, 11)),
+        {"id": "live", "session_id": "s", "event_type": "click", "timestamp": live},
+    ])
+    assert await server.archive_analytics_month(month) == 10
+
+    response = await api.get("/api/analytics/export", params={"from": month.replace(day=3).isoformat()})
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["id"] for event in events] == [f"a{day}" for day in range(3, 11)] + ["live"]
+    assert events[0]["timestamp"] == month.replace(day=3, hour=12).isoformat()
+
+    response = await api.get("/api/analytics/export", params={"format": "csv", "to": month.replace(day=2, hour=23).isoformat()})
+    rows = response.text.splitlines()
+    assert rows[0].startswith("id,session_id,event_type,timestamp")
+    assert [row.split(",")[0] for row in rows[1:]] == ["a1", "a2"]
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def jobs_server(server, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "ANALYTICS_ARCHIVE_DIR", tmp_path)
+    return server
+
+
+def make_job(**fields):
+    now = datetime.now(timezone.utc)
+    return {
+        "id": "job-1",
+        "type": "purge",
+        "status": "pending",
+        "from": None,
+        "to": now,
+        "chunk_size": 3,
+        "throttle_ms": 0,
+        "deleted": 0,
+        "total": None,
+        "last_id": None,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+        **fields,
+    }
+
+
+async def insert_events(server, count):
+    timestamp = datetime.now(timezone.utc) - timedelta(days=3)
+    await server.db.analytics_events.insert_many([
+        {"_id": f"e{i:02d}", "event_type": "pageview", "session_id": "s", "timestamp": timestamp}
+        for i in range(count)
+    ])
+
+
+async def wait_for_job(server, job_id, timeout=5):
+    for _ in range(int(timeout / 0.05)):
+        job = await server.db.analytics_jobs.find_one({"id": job_id}, {"_id": 0})
+        if job["status"] not in ("pending", "running"):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+async def test_purge_events_query_matches_string_timestamps(jobs_server):
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=2)
+    await jobs_server.db.analytics_events.insert_many([
+        {"_id": "native", "timestamp": end - timedelta(days=1)},
+        {"_id": "string", "timestamp": (end - timedelta(days=1)).isoformat()},
+        {"_id": "too-old", "timestamp": (end - timedelta(days=3)).isoformat()},
+    ])
+    matched = await jobs_server.db.analytics_events.distinct("_id", jobs_server.purge_events_query(start, end))
+    assert sorted(matched) == ["native", "string"]
+
+
+async def test_abandoned_job_resumes_from_checkpoint(jobs_server):
+    await insert_events(jobs_server, 10)
+    # A worker deleted e00..e03 and then died without a heartbeat
+    await jobs_server.db.analytics_events.delete_many({"_id": {"$lte": "e03"}})
+    stale = datetime.now(timezone.utc) - timedelta(seconds=jobs_server.ANALYTICS_JOB_LEASE_SECONDS + 1)
+    await jobs_server.db.analytics_jobs.insert_one(make_job(
+        status="running", worker_id="dead", attempts=1, updated_at=stale, total=10, last_id="e03", deleted=4,
+    ))
+
+    assert await jobs_server.resume_analytics_jobs() == 1
+    job = await wait_for_job(jobs_server, "job-1")
+
+    assert job["status"] == "completed"
+    assert (job["deleted"], job["attempts"], job["worker_id"]) == (10, 2, jobs_server.ANALYTICS_WORKER_ID)
+    assert await jobs_server.db.analytics_events.count_documents({}) == 0
+    assert jobs_server.analytics_job_status(job)["progress"] == 100.0
+
+
+async def test_live_job_is_not_resumed(jobs_server):
+    await jobs_server.db.analytics_jobs.insert_one(make_job(status="running", worker_id="other", attempts=1))
+    assert await jobs_server.resume_analytics_jobs() == 0
+
+
+async def test_taken_over_job_stops_without_writing(jobs_server):
+    await insert_events(jobs_server, 5)
+    await jobs_server.db.analytics_jobs.insert_one(make_job())
+    job = await jobs_server.claim_analytics_job("job-1")
+    # Another worker claims it while this one is stalled
+    await jobs_server.db.analytics_jobs.update_one({"id": "job-1"}, {"$set": {"worker_id": "other"}, "$inc": {"attempts": 1}})
+
+    await jobs_server.run_analytics_purge(job)
+
+    stored = await jobs_server.db.analytics_jobs.find_one({"id": "job-1"})
+    assert (stored["status"], stored["worker_id"], stored["total"]) == ("running", "other", None)
+    assert await jobs_server.db.analytics_events.count_documents({}) == 5
+
+
+async def test_clear_returns_job_when_another_worker_claims_it(jobs_server, monkeypatch):
+    async def lost_claim(job_id):
+        return None
+
+    monkeypatch.setattr(jobs_server, "claim_analytics_job", lost_claim)
+    result = await jobs_server.clear_analytics_data(None, None, 1000, 0)
+
+    assert result["status"] == "pending"
+    assert await jobs_server.db.analytics_jobs.find_one({"id": result["job_id"]}) is not None
+
+
+async def archive_month_of_events(server, month, days=20):
+    await server.persist_analytics_events(server.db, [
+        {"id": f"a{day}", "session_id": f"s{day}", "event_type": "pageview", "page_url": "/",
+         "timestamp": month.replace(day=day, hour=12)}
+        for day in range(1, days + 1)
+    ])
+    assert await server.archive_analytics_month(month) == days
+
+
+async def test_purge_rewrites_partly_covered_archive_month(jobs_server):
+    month = jobs_server.add_months(jobs_server.month_start(datetime.now(timezone.utc)), -3)
+    await archive_month_of_events(jobs_server, month)
+    end = month.replace(day=5, hour=23, minute=59)
+    await jobs_server.db.analytics_jobs.insert_one(make_job(**{"from": month, "to": end}))
+
+    await jobs_server.run_analytics_purge(await jobs_server.claim_analytics_job("job-1"))
+
+    job = await jobs_server.db.analytics_jobs.find_one({"id": "job-1"})
+    assert job["status"] == "completed"
+    assert (job["deleted"], job["archived_events_deleted"], job["archived_months_removed"]) == (5, 5, 0)
+    archived = jobs_server.read_analytics_archive(month, jobs_server.add_months(month, 1), ["id", "timestamp"])
+    assert sorted(archived["id"]) == sorted(f"a{day}" for day in range(6, 21))
+    assert not list(jobs_server.ANALYTICS_ARCHIVE_DIR.rglob("*.tmp"))
+
+
+async def test_purge_removes_wholly_covered_archive_month(jobs_server):
+    month = jobs_server.add_months(jobs_server.month_start(datetime.now(timezone.utc)), -3)
+    await archive_month_of_events(jobs_server, month)
+    await jobs_server.db.analytics_jobs.insert_one(make_job())
+
+    await jobs_server.run_analytics_purge(await jobs_server.claim_analytics_job("job-1"))
+
+    job = await jobs_server.db.analytics_jobs.find_one({"id": "job-1"})
+    assert (job["deleted"], job["archived_months_removed"]) == (20, 1)
+    assert not jobs_server.archive_partition_path(month).exists()
@@ -0,0 +1,34 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def record_traffic(window, sessions):
+    for session in sessions:
+        window.record(session, "pageview", "/pricing")
+
+
+async def test_window_is_per_worker_and_in_memory_by_default(server):
+    window = server.RealtimeWindow(1800, 1)
+    record_traffic(window, ["a", "b", "a"])
+    await window.flush()
+
+    snapshot = await window.snapshot()
+    assert snapshot["active_sessions"] == {"1m": 2, "5m": 2, "30m": 2}
+    assert snapshot["top_pages"] == [{"page": "/pricing", "count": 3}]
+    assert await server.db.analytics_realtime.count_documents({}) == 0
+
+
+async def test_shared_window_sums_workers(server):
+    first, second = server.RealtimeWindow(1800, 10, shared=True), server.RealtimeWindow(1800, 10, shared=True)
+    record_traffic(first, ["a", "b"])
+    record_traffic(second, ["b", "c"])
+    await first.flush()
+
+    # The second worker's slot is not flushed yet but counts for its own snapshots
+    assert (await second.snapshot())["active_sessions"]["1m"] == 3
+    assert (await first.snapshot())["active_sessions"]["1m"] == 2
+    await second.flush()
+    snapshot = await first.snapshot()
+    assert snapshot["active_sessions"]["1m"] == 3
+    assert snapshot["pageviews_last_5m"] == 4
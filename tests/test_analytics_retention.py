@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def day_start(days_ago):
+    now = datetime.now(timezone.utc)
+    return (now - timedelta(days=days_ago)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def make_events(days_ago, per_day=20):
+    """Events around noon of each day, so none straddle a day boundary"""
+    events = []
+    for day in days_ago:
+        for i in range(per_day):
+            events.append({
+                "id": f"{day}-{i}",
+                "session_id": f"s{day}-{i % 5}",
+                "event_type": "pageview" if i % 2 else "click",
+                "page_url": "/",
+                "timestamp": day_start(day) + timedelta(hours=12, minutes=i),
+            })
+    return events
+
+
+async def test_retention_compacts_old_days_and_keeps_stats(server):
+    await server.persist_analytics_events(server.db, make_events([1, 2, 5, 6, 7]))
+    before = await server.get_analytics_stats(10)
+
+    report = await server.apply_analytics_retention(retention_days=4)
+
+    assert report["days_compacted"] == 3
+    assert report["events_deleted"] == 60
+    assert await server.db.analytics_events.count_documents({}) == 40
+    assert await server.db.analytics_rollups.count_documents({"granularity": "day", "compacted": True}) == 3
+    cutoff = datetime.fromisoformat(report["cutoff"]).replace(tzinfo=None)
+    assert await server.db.analytics_rollups.count_documents({"granularity": "hour", "bucket": {"$lt": cutoff}}) == 0
+
+    after = await server.get_analytics_stats(10)
+    assert (after.page_views, after.button_clicks) == (before.page_views, before.button_clicks)
+
+
+async def test_retention_disabled(server):
+    assert await server.apply_analytics_retention(retention_days=0) == {"enabled": False}
+
+
+async def test_downsample_race_keeps_first_compaction(server):
+    await server.persist_analytics_events(server.db, make_events([5]))
+    start = day_start(5)
+
+    assert await server.downsample_analytics_day(start) == 20
+    compacted = await server.db.analytics_rollups.find_one({"_id": server.rollup_bucket_id(start, "day")})
+
+    # A slower run that read the day while its events were being deleted
+    await server.db.analytics_events.delete_many({})
+    assert await server.downsample_analytics_day(start) is None
+    assert await server.db.analytics_rollups.find_one({"_id": server.rollup_bucket_id(start, "day")}) == compacted
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_conflicting_topk_merge_is_deferred_to_next_flush(server, monkeypatch):
+    import analytics_store
+
+    timestamp = datetime.now(timezone.utc)
+    event = {"event_type": "pageview", "page_url": "/a", "country": "FR", "timestamp": timestamp}
+    bucket_id = server.rollup_bucket_id(server.rollup_bucket_start(timestamp, "hour"), "hour")
+
+    # Every merge attempt loses the topk_version race
+    monkeypatch.setattr(analytics_store, "ROLLUP_TOPK_RETRIES", 0)
+    batch = analytics_store.AnalyticsRollupBatch(server.db.analytics_rollups)
+    batch.add(event)
+    await batch.flush()
+    bucket = await server.db.analytics_rollups.find_one({"_id": bucket_id})
+    assert bucket["events"] == 1 and "topk" not in bucket
+    assert bucket_id in analytics_store.deferred_topk["analytics_rollups"]
+
+    monkeypatch.setattr(analytics_store, "ROLLUP_TOPK_RETRIES", 5)
+    batch.add(event)
+    await batch.flush()
+    bucket = await server.db.analytics_rollups.find_one({"_id": bucket_id})
+    assert bucket["events"] == 2
+    assert analytics_store.SpaceSaving.from_document(bucket["topk"]["page_url"]).estimates() == {"/a": 2}
+    assert not analytics_store.deferred_topk["analytics_rollups"]
@@ -0,0 +1,85 @@
+import pytest
+
+analytics_store = pytest.importorskip("analytics_store")
+HyperLogLog = analytics_store.HyperLogLog
+
+
+@pytest.mark.parametrize("distinct", [100, 5000, 50000])
+def test_hyperloglog_estimate_within_error(distinct):
+    sketch = HyperLogLog()
+    for i in range(distinct):
+        sketch.add(f"session-{i}")
+    # Three standard errors
+    assert abs(sketch.count() - distinct) <= 3 * sketch.relative_error * distinct
+
+
+def test_hyperloglog_ignores_duplicates():
+    sketch = HyperLogLog()
+    for _ in range(10):
+        for i in range(1000):
+            sketch.add(f"session-{i}")
+    assert abs(sketch.count() - 1000) <= 3 * sketch.relative_error * 1000
+
+
+def test_hyperloglog_sparse_merge_is_union():
+    left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(6000):
+        (left if i < 4000 else right).add(f"s{i}")
+        union.add(f"s{i}")
+    for i in range(2000, 4000):
+        right.add(f"s{i}")
+
+    merged = HyperLogLog()
+    for sketch in (left, right):
+        merged.merge_sparse({str(index): rank for index, rank in enumerate(sketch.registers) if rank})
+    assert merged.registers == union.registers
+    assert merged.count() == union.count()
+
+
+def test_hyperloglog_position_is_stable():
+    # Registers are merged across processes and stored in MongoDB
+    assert HyperLogLog.position("abc") == HyperLogLog.position("abc")
+    index, rank = HyperLogLog.position("abc")
+    assert 0 <= index < 1 << analytics_store.HLL_PRECISION
+    assert rank >= 1
+
+
+SpaceSaving = analytics_store.SpaceSaving
+
+
+def zipf_counts(values=500):
+    return {f"/page-{i}": 1000 // (i + 1) for i in range(values)}
+
+
+def summarize_in_batches(counts, batches=10, capacity=20):
+    summary = SpaceSaving(capacity)
+    for batch in range(batches):
+        summary.merge(SpaceSaving.from_counts(
+            {value: count // batches + (batch < count % batches) for value, count in counts.items()}, capacity
+        ))
+    return summary
+
+
+def test_space_saving_keeps_heavy_hitters():
+    counts = zipf_counts()
+    summary = summarize_in_batches(counts)
+    assert {f"/page-{i}" for i in range(5)} <= set(summary.counters)
+
+
+def test_space_saving_error_bounds():
+    counts = zipf_counts()
+    summary = summarize_in_batches(counts)
+    for value, (count, error) in summary.counters.items():
+        assert count - error <= counts[value] <= count
+
+
+def test_space_saving_merge_stays_within_capacity():
+    left = SpaceSaving.from_counts({f"a{i}": i for i in range(100)}, 10)
+    right = SpaceSaving.from_counts({f"b{i}": i for i in range(100)}, 10)
+    left.merge(right)
+    assert len(left.counters) == 10
+
+
+def test_space_saving_document_round_trip():
+    summary = SpaceSaving.from_counts({"/a.b": 3, "$ref": 2})
+    assert SpaceSaving.from_document(summary.to_document()).counters == summary.counters
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def day_start(days_ago):
+    now = datetime.now(timezone.utc)
+    return (now - timedelta(days=days_ago)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def test_compacted_days_come_from_rollups(server):
+    await server.persist_analytics_events(server.db, [
+        {"id": f"{day}-{i}", "session_id": f"s{day}-{i % 4}", "event_type": "pageview", "page_url": "/",
+         "timestamp": day_start(day) + timedelta(hours=12, minutes=i)}
+        for day in (3, 6) for i in range(10)
+    ])
+    await server.apply_analytics_retention(retention_days=4)
+    assert await server.db.analytics_events.count_documents({}) == 10
+
+    pageviews = await server.get_analytics_timeseries("pageviews", "day", 7, None)
+    values = dict(zip(pageviews["buckets"], pageviews["series"][0]["values"]))
+    assert values[day_start(6).isoformat()] == 10
+    assert values[day_start(3).isoformat()] == 10
+
+    sessions = await server.get_analytics_timeseries("sessions", "day", 7, None)
+    values = dict(zip(sessions["buckets"], sessions["series"][0]["values"]))
+    assert values[day_start(6).isoformat()] == 4
+
+
+async def test_split_series_past_retention_horizon_rejected(server, monkeypatch):
+    monkeypatch.setattr(server, "ANALYTICS_RAW_RETENTION_DAYS", 7)
+    with pytest.raises(server.HTTPException) as error:
+        await server.get_analytics_timeseries("pageviews", "day", 30, "device_type")
+    assert error.value.status_code == 400
+    with pytest.raises(server.HTTPException):
+        await server.get_analytics_timeseries("pageviews", "hour", 14, None)
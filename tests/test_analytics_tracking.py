@@ -0,0 +1,48 @@
+import pytest
+from pymongo.errors import AutoReconnect
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def api(server):
+    httpx = pytest.importorskip("httpx")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
+
+
+def batch(size=3):
+    return [{"event_type": "pageview", "page_url": f"/{i}", "session_id": f"s{i}"} for i in range(size)]
+
+
+async def unavailable(*args, **kwargs):
+    raise AutoReconnect("primary stepped down")
+
+
+async def test_stored_events_are_accepted_when_rollups_fail(api, server, monkeypatch):
+    import analytics_store
+
+    monkeypatch.setattr(analytics_store.AnalyticsRollupBatch, "flush", unavailable)
+    monkeypatch.setattr(analytics_store, "upsert_sessions", unavailable)
+    response = await api.post("/api/analytics/track/batch", json=batch())
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["success"], body["accepted"]) == (True, 3)
+    stored = await server.db.analytics_events.distinct("id")
+    assert sorted(stored) == sorted(result["event_id"] for result in body["results"])
+
+
+async def test_failed_insert_reports_every_event(api, server, monkeypatch):
+    from mongomock.collection import Collection
+
+    def insert_many(*args, **kwargs):
+        raise AutoReconnect("primary stepped down")
+
+    monkeypatch.setattr(Collection, "insert_many", insert_many)
+    response = await api.post("/api/analytics/track/batch", json=batch())
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["success"], body["accepted"], body["rejected"]) == (False, 0, 3)
+    assert all("write failed" in result["error"] for result in body["results"])
@@ -0,0 +1,113 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def api(server):
+    httpx = pytest.importorskip("httpx")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ('"v1"', True),
+    ('W/"v1"', True),
+    ('"v0", W/"v1"', True),
+    ("*", True),
+    ('"v2"', False),
+])
+def test_etag_matches(server, if_none_match, expected):
+    assert server.etag_matches(if_none_match, 'W/"v1"') is expected
+
+
+async def test_content_route_answers_304_until_written(api):
+    response = await api.get("/api/footer-settings")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "stale-while-revalidate" in response.headers["cache-control"]
+
+    revalidated = await api.get("/api/footer-settings", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.content == b""
+
+    assert (await api.put("/api/footer-settings", json={"company_name": "Renamed"})).status_code == 200
+    changed = await api.get("/api/footer-settings", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["company_name"] == "Renamed"
+
+
+async def test_failed_version_bump_keeps_the_write_and_disables_caching(api, server, monkeypatch):
+    import asyncio
+    from pymongo.errors import AutoReconnect
+
+    etag = (await api.get("/api/footer-settings")).headers["etag"]
+    bump_content_versions = server.bump_content_versions
+
+    async def unavailable(*args, **kwargs):
+        raise AutoReconnect("primary stepped down")
+
+    monkeypatch.setattr(server, "CONTENT_VERSION_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(server, "bump_content_versions", unavailable)
+    response = await api.put("/api/footer-settings", json={"company_name": "Renamed"})
+    assert response.status_code == 200
+
+    # Until the bump goes through, the old ETag must not validate
+    stale = await api.get("/api/footer-settings", headers={"If-None-Match": etag})
+    assert stale.status_code == 200
+    assert "etag" not in stale.headers
+    assert stale.json()["company_name"] == "Renamed"
+
+    monkeypatch.setattr(server, "bump_content_versions", bump_content_versions)
+    for _ in range(100):
+        if not server.content_versions.dirty:
+            break
+        await asyncio.sleep(0.01)
+    fresh = await api.get("/api/footer-settings", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip, br;q=0", "gzip"),
+    ("br;q=0, gzip;q=0", "identity"),
+    ("*", "br"),
+    ("*;q=0, gzip", "gzip"),
+    ("identity", "identity"),
+    ("", "identity"),
+])
+def test_negotiate_encoding(server, accept_encoding, expected):
+    assert server.negotiate_encoding(accept_encoding, {"identity", "gzip", "br"}) == expected
+
+
+def test_negotiate_encoding_skips_unavailable(server):
+    assert server.negotiate_encoding("br, gzip", {"identity", "gzip"}) == "gzip"
+    assert server.negotiate_encoding("br, gzip", {"identity"}) == "identity"
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "br", "identity"])
+async def test_cached_body_round_trips_in_every_encoding(api, server, accept_encoding):
+    if accept_encoding == "br":
+        pytest.importorskip("brotli")
+    plain = await api.get("/api/partners", headers={"Accept-Encoding": "identity"})
+    response = await api.get("/api/partners", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.headers.get("content-encoding", "identity") == accept_encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == plain.json()
+    assert server.response_cache.stats()["entries"] == 1
+
+
+async def test_cache_keys_ignore_undeclared_params(api, server):
+    await api.get("/api/partners")
+    for i in range(5):
+        await api.get(f"/api/partners?utm_source={i}")
+    assert (server.response_cache.hits, len(server.response_cache.entries)) == (5, 1)
+
+    media = await api.get("/api/partners?category=media")
+    assert len(server.response_cache.entries) == 2
+    assert {partner["category"] for partner in media.json()} == {"media"}
@@ -0,0 +1,89 @@
+import ipaddress
+
+import pytest
+
+build_geoip_table = pytest.importorskip("build_geoip_table")
+
+CSV = """start_ip,end_ip,country,city
+1.0.0.0,1.0.0.255,AU,Sydney
+1.0.1.0,1.0.1.255,AU,Sydney
+1.0.2.0,1.0.3.255,CN,Fuzhou
+1.0.3.0,1.0.4.255,JP,Tokyo
+1.0.3.128,1.0.3.200,US,Overlapped
+16843009,16843009,US,
+::1,::2,ZZ,IPv6
+"""
+
+
+def ip(address):
+    return int(ipaddress.ip_address(address))
+
+
+@pytest.fixture
+def table(server, tmp_path):
+    csv_path, table_path = tmp_path / "ranges.csv", tmp_path / "geoip.bin"
+    csv_path.write_text(CSV)
+    ranges = build_geoip_table.normalize_ranges(build_geoip_table.read_ranges(csv_path, 2, 3))
+    build_geoip_table.write_table(ranges, table_path)
+    table = server.GeoIPTable(table_path)
+    yield table
+    table.close()
+
+
+def test_normalize_joins_adjacent_and_trims_overlaps(tmp_path):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(CSV)
+    ranges = build_geoip_table.normalize_ranges(build_geoip_table.read_ranges(csv_path, 2, 3))
+    assert ranges == [
+        (ip("1.0.0.0"), ip("1.0.1.255"), "AU", "Sydney"),
+        (ip("1.0.2.0"), ip("1.0.3.255"), "CN", "Fuzhou"),
+        (ip("1.0.4.0"), ip("1.0.4.255"), "JP", "Tokyo"),
+        (ip("1.1.1.1"), ip("1.1.1.1"), "US", "Unknown"),
+    ]
+
+
+@pytest.mark.parametrize("address, location", [
+    ("0.255.255.255", None),
+    ("1.0.0.0", ("AU", "Sydney")),
+    ("1.0.1.255", ("AU", "Sydney")),
+    ("1.0.3.150", ("CN", "Fuzhou")),
+    ("1.0.3.255", ("CN", "Fuzhou")),
+    ("1.0.4.0", ("JP", "Tokyo")),
+    ("1.0.5.0", None),
+    ("1.1.1.1", ("US", "Unknown")),
+    ("1.1.1.2", None),
+    ("255.255.255.255", None),
+])
+def test_lookup_round_trip(table, address, location):
+    assert table.count == 4
+    assert table.lookup(ip(address)) == location
+
+
+def test_truncated_table_is_rejected(server, tmp_path):
+    path = tmp_path / "geoip.bin"
+    build_geoip_table.write_table([(1, 2, "AU", "Sydney")], path)
+    path.write_bytes(path.read_bytes()[:-3])
+    with pytest.raises(ValueError):
+        server.GeoIPTable(path)
+
+
+def make_request(server, peer, **headers):
+    return server.Request({
+        "type": "http",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+        "client": (peer, 51234),
+    })
+
+
+@pytest.mark.parametrize("peer, headers, expected", [
+    # Anyone can send the headers: ignored unless a trusted proxy connects
+    ("203.0.113.9", {"x_forwarded_for": "198.51.100.7", "x_real_ip": "198.51.100.8"}, "203.0.113.9"),
+    # The client prepended a spoofed hop; the proxy appended the real one
+    ("10.0.0.1", {"x_forwarded_for": "6.6.6.6, 198.51.100.7"}, "198.51.100.7"),
+    ("10.0.0.1", {"x_forwarded_for": "6.6.6.6, 198.51.100.7, 10.0.0.2"}, "198.51.100.7"),
+    ("10.0.0.1", {"x_forwarded_for": "10.0.0.5, 10.0.0.2"}, "10.0.0.5"),
+    ("10.0.0.1", {"x_real_ip": "198.51.100.8"}, "198.51.100.8"),
+    ("10.0.0.1", {}, "10.0.0.1"),
+])
+def test_client_ip_trusts_only_proxies(server, peer, headers, expected):
+    assert server.client_ip(make_request(server, peer, **headers)) == expected
@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.mark.parametrize("referrer, expected", [
+    ("https://www.google.com/search?q=x", ("search", "Google")),
+    ("https://google.co.uk/", ("search", "Google")),
+    ("https://news.google.de/articles", ("search", "Google")),
+    ("https://WWW.GOOGLE.COM./", ("search", "Google")),
+    ("google.com", ("search", "Google")),
+    ("https://google.evil.com/", ("referral", "google.evil.com")),
+    ("https://google.com.evil.io/", ("referral", "google.com.evil.io")),
+    ("https://mygoogle.com/", ("referral", "mygoogle.com")),
+    ("example.org/blog", ("referral", "example.org")),
+])
+def test_referrer_classification(server, referrer, expected):
+    assert server.determine_traffic_source(referrer) == {"traffic_source": expected[0], "source_detail": expected[1]}
+
+
+@pytest.mark.parametrize("referrer", [None, ""])
+def test_missing_referrer_is_direct(server, referrer):
+    assert server.determine_traffic_source(referrer) == {"traffic_source": "direct", "source_detail": "Direct"}